@@ -12,7 +12,8 @@ from pathlib import Path
 from urllib.parse import quote
 from urllib.parse import urlsplit
 
-from flask import Blueprint, Response, jsonify, request, session, stream_with_context
+from flask import Blueprint, Response, jsonify, request, send_file, session, stream_with_context
+from werkzeug.wsgi import ClosingIterator
 
 from ..config import (
     CODEX_ALLOW_TRUSTED_HTTP_CRYPTO_FALLBACK,
@@ -91,10 +92,13 @@ from ..services.codex_chat import (
     get_verification_mode_options,
     get_usage_history_summary,
     get_session,
+    get_session_message,
+    get_session_messages,
     get_settings,
     get_structured_report_preset,
     get_git_worktree_task,
     get_github_action_template_preview,
+    get_codex_stream_lock_stats,
     get_mcp_setup_preview,
     get_usage_summary,
     handoff_git_worktree_task,
@@ -108,6 +112,7 @@ from ..services.codex_chat import (
     list_codex_streams,
     list_git_worktree_tasks,
     read_codex_stream,
+    iter_codex_stream_events,
     list_sessions,
     normalize_codex_attachments,
     normalize_verification_mode,
@@ -140,7 +145,7 @@ from ..services.codex_chat import (
 )
 from ..services.file_browser import (
     FileBrowserError,
-    build_download_payload,
+    build_download_stream,
     build_mail_archive_payload,
     create_directory,
     create_file,
@@ -150,6 +155,9 @@ from ..services.file_browser import (
     move_files,
     read_file,
     read_file_raw,
+    release_download_stream,
+    release_mail_archive_payload,
+    search_files,
     upload_files,
     write_file,
     write_file_patch,
@@ -1609,6 +1617,38 @@ def codex_session_detail(session_id):
     return _jsonify_chat_payload_or_crypto_error({'session': session}, crypto_session_id)
 
 
+@bp.route('/api/codex/sessions/<session_id>/messages')
+def codex_session_messages(session_id):
+    try:
+        crypto_session_id = _get_chat_response_crypto_session_id()
+    except FileCryptoError as exc:
+        return _file_crypto_error_response(exc)
+    try:
+        limit = int(request.args.get('limit', 0))
+    except (TypeError, ValueError):
+        limit = 0
+    page = get_session_messages(
+        session_id,
+        limit=limit,
+        before_message_id=request.args.get('before') or None,
+    )
+    if not page:
+        return jsonify({'error': '세션을 찾을 수 없습니다.'}), 404
+    return _jsonify_chat_payload_or_crypto_error(page, crypto_session_id)
+
+
+@bp.route('/api/codex/sessions/<session_id>/messages/<message_id>')
+def codex_session_message_detail(session_id, message_id):
+    try:
+        crypto_session_id = _get_chat_response_crypto_session_id()
+    except FileCryptoError as exc:
+        return _file_crypto_error_response(exc)
+    message = get_session_message(session_id, message_id)
+    if not message:
+        return jsonify({'error': '대화를 찾을 수 없습니다.'}), 404
+    return _jsonify_chat_payload_or_crypto_error({'message': message}, crypto_session_id)
+
+
 @bp.route('/api/codex/sessions/<session_id>', methods=['PATCH'])
 def codex_session_rename(session_id):
     try:
@@ -1733,7 +1773,7 @@ def codex_session_message(session_id):
 
     ensure_default_title(session_id, prompt)
 
-    prompt_with_context = build_codex_prompt(session.get('messages', []), prompt)
+    prompt_with_context = build_codex_prompt(session.get('messages', []), prompt, session_id=session_id)
     if plan_mode:
         prompt_with_context = _append_plan_mode_guardrails(prompt_with_context)
     model_override = _resolve_model_override(plan_mode=plan_mode)
@@ -1881,7 +1921,7 @@ def codex_session_message_stream(session_id):
         ), 409
 
     ensure_default_title(session_id, prompt)
-    prompt_with_context = build_codex_prompt(session.get('messages', []), prompt)
+    prompt_with_context = build_codex_prompt(session.get('messages', []), prompt, session_id=session_id)
     if plan_mode:
         prompt_with_context = _append_plan_mode_guardrails(prompt_with_context)
     if structured_report_preset:
@@ -2096,11 +2136,58 @@ def codex_stream_output(stream_id):
     return _jsonify_chat_payload_or_crypto_error(response, crypto_session_id)
 
 
+@bp.route('/api/codex/streams/<stream_id>/events')
+def codex_stream_events(stream_id):
+    # EventSource cannot send custom headers, so the crypto session may also arrive as a query arg.
+    try:
+        crypto_session_id = str(request.args.get('crypto_session') or '').strip()
+        if crypto_session_id:
+            crypto_session_id = validate_chat_crypto_session(crypto_session_id)
+        else:
+            crypto_session_id = _get_chat_response_crypto_session_id()
+    except FileCryptoError as exc:
+        return _file_crypto_error_response(exc)
+    offsets = []
+    for key in ('offset', 'error_offset', 'event_offset'):
+        try:
+            offsets.append(max(int(request.args.get(key, 0)), 0))
+        except (TypeError, ValueError):
+            offsets.append(0)
+
+    events = iter_codex_stream_events(stream_id, *offsets)
+    if events is None:
+        return jsonify({'error': '스트림을 찾을 수 없습니다.'}), 404
+
+    @stream_with_context
+    def generate():
+        yield 'retry: 1000\n\n'
+        for item in events:
+            data = item.get('data')
+            if crypto_session_id and item.get('event') == 'delta':
+                try:
+                    data = encrypt_chat_payload(crypto_session_id, data)
+                except FileCryptoError as exc:
+                    yield _format_sse_payload(
+                        {'error': str(exc), 'error_code': exc.error_code},
+                        event='error',
+                    )
+                    return
+            yield _format_sse_payload(data, event=item.get('event'))
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @bp.route('/api/codex/streams')
 def codex_streams_list():
     cleanup_codex_streams()
     include_done = request.args.get('include_done') == '1'
-    return jsonify({'streams': list_codex_streams(include_done=include_done)})
+    return jsonify({
+        'streams': list_codex_streams(include_done=include_done),
+        'lock_stats': get_codex_stream_lock_stats(),
+    })
 
 
 @bp.route('/api/codex/streams/<stream_id>/stop', methods=['POST'])
@@ -2126,6 +2213,26 @@ def codex_files_list():
         result = list_directory(
             root_key=payload.get('root'),
             relative_path=payload.get('path', ''),
+            offset=payload.get('offset', 0),
+            limit=payload.get('limit'),
+        )
+    except FileBrowserError as exc:
+        return jsonify({'error': str(exc), 'error_code': exc.error_code}), exc.status_code
+    return jsonify(result)
+
+
+@bp.route('/api/codex/files/search', methods=['POST'])
+def codex_files_search():
+    if not CODEX_ENABLE_FILES_API:
+        return _feature_disabled_response('files')
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        payload = {}
+    try:
+        result = search_files(
+            root_key=payload.get('root'),
+            query=payload.get('query', ''),
+            limit=payload.get('limit'),
         )
     except FileBrowserError as exc:
         return jsonify({'error': str(exc), 'error_code': exc.error_code}), exc.status_code
@@ -2296,6 +2403,36 @@ def codex_files_raw(root_key, relative_path):
     return response
 
 
+def _file_download_response(result):
+    mime_type = result.get('mime_type') or 'application/octet-stream'
+    if result.get('file_path'):
+        # Single files and cached archives: send_file streams from disk and
+        # answers Range requests on GET. A cached archive stays pinned against
+        # eviction until the response is closed.
+        try:
+            response = send_file(result['file_path'], mimetype=mime_type, conditional=True)
+        except Exception:
+            release_download_stream(result)
+            raise
+        if result.get('archive_cache_key'):
+            # Releasing is idempotent. A passthrough file body is closed by
+            # the server without Response.close, so the body carries the
+            # release too; call_on_close covers bodies that are never sent.
+            def release():
+                release_download_stream(result)
+
+            response.call_on_close(release)
+            response.response = ClosingIterator(response.response, release)
+    else:
+        # The archive is produced while it is sent, so its length is unknown.
+        response = Response(result['chunks'], mimetype=mime_type)
+    download_name = str(result.get('download_name') or 'download.bin').strip() or 'download.bin'
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(download_name)}"
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
 @bp.route('/api/codex/files/download', methods=['POST'])
 def codex_files_download():
     if not CODEX_ENABLE_FILES_API:
@@ -2304,22 +2441,27 @@ def codex_files_download():
     if not isinstance(payload, dict):
         payload = {}
     try:
-        result = build_download_payload(
+        result = build_download_stream(
             root_key=payload.get('root'),
             relative_paths=payload.get('paths'),
         )
     except FileBrowserError as exc:
         return jsonify({'error': str(exc), 'error_code': exc.error_code}), exc.status_code
+    return _file_download_response(result)
 
-    response = Response(
-        result.get('content') or b'',
-        mimetype=result.get('mime_type') or 'application/octet-stream',
-    )
-    download_name = str(result.get('download_name') or 'download.bin').strip() or 'download.bin'
-    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(download_name)}"
-    response.headers['Cache-Control'] = 'no-store'
-    response.headers['X-Content-Type-Options'] = 'nosniff'
-    return response
+
+@bp.route('/api/codex/files/download/<root_key>/<path:relative_path>', methods=['GET'])
+def codex_files_download_path(root_key, relative_path):
+    if not CODEX_ENABLE_FILES_API:
+        return _feature_disabled_response('files')
+    try:
+        result = build_download_stream(
+            root_key=root_key,
+            relative_paths=[relative_path],
+        )
+    except FileBrowserError as exc:
+        return jsonify({'error': str(exc), 'error_code': exc.error_code}), exc.status_code
+    return _file_download_response(result)
 
 
 @bp.route('/api/codex/files/mail', methods=['POST'])
@@ -2329,6 +2471,7 @@ def codex_files_mail():
     payload = request.get_json(silent=True) or {}
     if not isinstance(payload, dict):
         payload = {}
+    archive = None
     try:
         archive = build_mail_archive_payload(
             root_key=payload.get('root'),
@@ -2348,6 +2491,8 @@ def codex_files_mail():
         return jsonify({'error': str(exc), 'error_code': exc.error_code}), exc.status_code
     except MailSendError as exc:
         return jsonify({'error': str(exc), 'error_code': exc.error_code}), exc.status_code
+    finally:
+        release_mail_archive_payload(archive)
 
     return jsonify({
         **mail_result,
@@ -242,6 +242,12 @@ CODEX_MAX_ATTACHMENT_BYTES = _parse_int_env(
     maximum=128 * 1024 * 1024,
 )
 CODEX_STREAM_TTL_SECONDS = 900
+CODEX_STREAM_BUFFER_SPILL_CHARS = _parse_int_env(
+    'CODEX_STREAM_BUFFER_SPILL_CHARS',
+    2 * 1024 * 1024,
+    minimum=64 * 1024,
+    maximum=256 * 1024 * 1024,
+)
 CODEX_STREAM_POLL_INTERVAL_SECONDS = float(os.environ.get('CODEX_STREAM_POLL_INTERVAL_SECONDS', '0.5'))
 CODEX_STREAM_POST_OUTPUT_IDLE_SECONDS = float(os.environ.get('CODEX_STREAM_POST_OUTPUT_IDLE_SECONDS', '15'))
 CODEX_STREAM_TERMINATE_GRACE_SECONDS = float(os.environ.get('CODEX_STREAM_TERMINATE_GRACE_SECONDS', '3'))
@@ -1360,13 +1366,34 @@ CODEX_FILE_MAX_SINGLE_DOWNLOAD_BYTES = _parse_int_env(
     'CODEX_FILE_MAX_SINGLE_DOWNLOAD_BYTES',
     64 * 1024 * 1024,
     minimum=1024,
-    maximum=512 * 1024 * 1024,
+    maximum=64 * 1024 * 1024 * 1024,
 )
 CODEX_FILE_MAX_ARCHIVE_DOWNLOAD_BYTES = _parse_int_env(
     'CODEX_FILE_MAX_ARCHIVE_DOWNLOAD_BYTES',
     128 * 1024 * 1024,
     minimum=1024,
-    maximum=512 * 1024 * 1024,
+    maximum=64 * 1024 * 1024 * 1024,
+)
+CODEX_FILE_ARCHIVE_CACHE_BYTES = _parse_int_env(
+    'CODEX_FILE_ARCHIVE_CACHE_BYTES',
+    512 * 1024 * 1024,
+    minimum=0,
+    maximum=64 * 1024 * 1024 * 1024,
+)
+# Keep generated archives out of every file browser root so the cache never
+# shows up in listings, search or other archives.
+_archive_cache_dir_override = _expand_path_value(os.environ.get('CODEX_FILE_ARCHIVE_CACHE_DIR'))
+_user_cache_home = _expand_path_value(os.environ.get('XDG_CACHE_HOME')) or Path.home() / '.cache'
+CODEX_FILE_ARCHIVE_CACHE_DIR = (
+    _archive_cache_dir_override
+    if _archive_cache_dir_override is not None
+    else _user_cache_home / 'codex-workbench' / 'archives'
+)
+CODEX_FILE_ARCHIVE_COMPRESS_WORKERS = _parse_int_env(
+    'CODEX_FILE_ARCHIVE_COMPRESS_WORKERS',
+    1,
+    minimum=1,
+    maximum=32,
 )
 CODEX_MAIL_SMTP_HOST = os.environ.get('CODEX_MAIL_SMTP_HOST', 'smtp.naver.com').strip() or 'smtp.naver.com'
 CODEX_MAIL_SMTP_PORT = _parse_int_env('CODEX_MAIL_SMTP_PORT', 465, minimum=1, maximum=65535)
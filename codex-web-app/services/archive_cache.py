@@ -0,0 +1,197 @@
+"""On-disk cache of generated zip archives for file downloads and mail."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+_ARCHIVE_SUFFIX = '.zip'
+_TEMP_SUFFIX = '.part'
+
+
+def archive_cache_key(*parts):
+    """Return a stable digest for JSON-serializable key ``parts``."""
+    encoded = json.dumps(parts, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ArchiveCache:
+    """Size-bounded LRU of archive files kept in one directory.
+
+    Archives are written to a temp name and renamed into place once complete,
+    so a reader never sees a partial file. The LRU order lives in memory and
+    is seeded from file mtimes the first time the directory is used; hits
+    touch the file so that order survives a restart.
+
+    An archive larger than the whole budget is never kept. Callers that read
+    the file after the request returns ``pin`` it so eviction leaves it alone
+    until they ``release`` it.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max(0, int(max_bytes or 0))
+        self._lock = threading.Lock()
+        self._entries = None
+        self._pins = {}
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _path_for(self, key):
+        return self.directory / f'{key}{_ARCHIVE_SUFFIX}'
+
+    def _load_entries_locked(self):
+        if self._entries is not None:
+            return self._entries
+        found = []
+        try:
+            with os.scandir(self.directory) as iterator:
+                for entry in iterator:
+                    if not entry.name.endswith(_ARCHIVE_SUFFIX):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    found.append((stat.st_mtime_ns, entry.name[:-len(_ARCHIVE_SUFFIX)], stat.st_size))
+        except OSError:
+            pass
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(found))
+        return self._entries
+
+    def lookup(self, key, *, pin=False):
+        """Return the cached archive path for ``key`` or ``None``.
+
+        With ``pin`` the entry is also pinned; pair it with :meth:`release`.
+        """
+        if not self.enabled:
+            return None
+        path = self._path_for(key)
+        with self._lock:
+            entries = self._load_entries_locked()
+            if key not in entries:
+                return None
+            if not path.is_file():
+                entries.pop(key, None)
+                return None
+            entries.move_to_end(key)
+            if pin:
+                self._pins[key] = self._pins.get(key, 0) + 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def release(self, key):
+        """Drop one pin taken by ``lookup`` or ``store``."""
+        with self._lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+                return
+            self._pins.pop(key, None)
+            if self._entries is not None:
+                self._evict_locked()
+
+    def store_stream(self, key, chunks, *, size_hint=None):
+        """Yield ``chunks`` unchanged while saving them as the archive for ``key``.
+
+        The archive is only committed when the generator runs to completion
+        and fits the budget; an abandoned, failed or oversized stream leaves
+        nothing behind. ``size_hint`` skips caching up front when the source
+        data alone is already over budget.
+        """
+        yield from self._write_through(key, chunks, size_hint=size_hint)
+
+    def store(self, key, chunks, *, size_hint=None, pin=False):
+        """Write ``chunks`` as the archive for ``key`` and return its path.
+
+        Returns ``None`` when nothing was cached: the cache is disabled or the
+        archive does not fit the budget. With ``pin`` the new entry is pinned.
+        """
+        committed = []
+        for _ in self._write_through(key, chunks, size_hint=size_hint, pin=pin, committed=committed):
+            pass
+        return self._path_for(key) if committed else None
+
+    def _write_through(self, key, chunks, *, size_hint=None, pin=False, committed=None):
+        if not self.enabled or (size_hint is not None and size_hint > self.max_bytes):
+            yield from chunks
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_path = self.directory / f'.{key}.{uuid.uuid4().hex}{_TEMP_SUFFIX}'
+        handle = open(temp_path, 'wb')
+        kept = False
+        try:
+            written = 0
+            for chunk in chunks:
+                if handle is not None:
+                    written += len(chunk)
+                    if written > self.max_bytes:
+                        # Keep streaming, but this archive will never be cached.
+                        handle.close()
+                        handle = None
+                    else:
+                        handle.write(chunk)
+                yield chunk
+            if handle is not None:
+                handle.close()
+                handle = None
+                try:
+                    self._commit(key, temp_path, pin=pin)
+                except OSError:
+                    # Another request may hold the existing file open; the bytes
+                    # were already delivered, so just skip caching this copy.
+                    pass
+                else:
+                    kept = True
+                    if committed is not None:
+                        committed.append(key)
+        finally:
+            if handle is not None:
+                handle.close()
+            if not kept:
+                try:
+                    temp_path.unlink()
+                except OSError:
+                    pass
+
+    def _commit(self, key, temp_path, *, pin=False):
+        size = temp_path.stat().st_size
+        path = self._path_for(key)
+        os.replace(temp_path, path)
+        with self._lock:
+            entries = self._load_entries_locked()
+            entries[key] = size
+            entries.move_to_end(key)
+            if pin:
+                self._pins[key] = self._pins.get(key, 0) + 1
+            self._evict_locked()
+
+    def _evict_locked(self):
+        # Committed archives fit the budget on their own, so walking from the
+        # oldest end stops before the newest one unless older entries are
+        # pinned. Pinned entries stay until they are released.
+        entries = self._entries
+        total = sum(entries.values())
+        for key in list(entries):
+            if total <= self.max_bytes:
+                break
+            if self._pins.get(key):
+                continue
+            try:
+                self._path_for(key).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # Still open elsewhere (Windows); try again on the next commit.
+                continue
+            total -= entries.pop(key)
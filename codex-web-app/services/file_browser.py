@@ -2,25 +2,47 @@
 
 from __future__ import annotations
 
-import io
+import logging
 import mimetypes
+import os
 import shutil
+import struct
 import tempfile
+import threading
 import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from zipfile import ZIP_DEFLATED, ZipFile
+from zipfile import ZIP64_LIMIT, ZIP_DEFLATED, ZIP_STORED, ZipInfo
 
 from ..config import (
+    CODEX_FILE_ARCHIVE_CACHE_BYTES,
+    CODEX_FILE_ARCHIVE_CACHE_DIR,
+    CODEX_FILE_ARCHIVE_COMPRESS_WORKERS,
     CODEX_FILE_MAX_ARCHIVE_DOWNLOAD_BYTES,
     CODEX_FILE_MAX_SINGLE_DOWNLOAD_BYTES,
     WORKSPACE_DIR,
 )
+from .archive_cache import ArchiveCache, archive_cache_key
+from .file_index import ready_file_index
+
+_LOGGER = logging.getLogger(__name__)
 
 BROWSER_ROOT_SERVER = 'server'
 BROWSER_ROOT_TMP = 'tmp'
 BROWSER_ROOT_WORKSPACE = 'workspace'
 
 _MAX_LIST_ENTRIES = 2000
+_DEFAULT_SEARCH_RESULTS = 50
+_MAX_SEARCH_RESULTS = 500
+_MAX_SEARCH_QUERY_CHARS = 200
+# Listings are reused while the directory mtime is unchanged. Editing a file
+# does not touch its directory, so sizes may lag by up to the TTL.
+_LIST_CACHE_TTL_SECONDS = 5.0
+_LIST_CACHE_MAX_DIRECTORIES = 64
+_LIST_CACHE = {}
+_LIST_CACHE_LOCK = threading.Lock()
 # Text is sent as JSON and may be highlighted or rendered client-side.  Keep the
 # server ceiling moderate so callers cannot turn a preview request into an
 # unbounded memory/DOM operation, while allowing useful inspection of larger
@@ -34,6 +56,38 @@ _MAX_MULTI_DOWNLOAD_TOTAL_BYTES = int(CODEX_FILE_MAX_ARCHIVE_DOWNLOAD_BYTES)
 _MAX_FILE_UPLOAD_BYTES = 256 * 1024 * 1024
 _MAX_MULTI_UPLOAD_TOTAL_BYTES = 512 * 1024 * 1024
 _DELETE_QUARANTINE_PREFIX = '.codex-delete-'
+_ARCHIVE_STREAM_CHUNK_BYTES = 1024 * 1024
+# Members up to this size are deflated on a worker pool and written whole;
+# larger ones stream through the request thread so memory stays bounded.
+_ARCHIVE_COMPRESS_WORKERS = int(CODEX_FILE_ARCHIVE_COMPRESS_WORKERS)
+_ARCHIVE_COMPRESS_POOLS = {}
+_ARCHIVE_COMPRESS_POOLS_LOCK = threading.Lock()
+_ARCHIVE_PARALLEL_MEMBER_MAX_BYTES = 16 * 1024 * 1024
+_ARCHIVE_PARALLEL_PENDING_MAX_BYTES = 64 * 1024 * 1024
+_ARCHIVE_CACHE_DIR = Path(CODEX_FILE_ARCHIVE_CACHE_DIR)
+_ARCHIVE_CACHE_MAX_BYTES = int(CODEX_FILE_ARCHIVE_CACHE_BYTES)
+_ARCHIVE_CACHE_FORMAT = 1
+_ARCHIVE_CACHES = {}
+_ARCHIVE_CACHES_LOCK = threading.Lock()
+# Deflating data that is already compressed costs CPU and saves nothing.
+_ARCHIVE_STORED_SUFFIXES = frozenset({
+    '.7z', '.apk', '.avi', '.br', '.bz2', '.docx', '.flac', '.gif', '.gz',
+    '.heic', '.jar', '.jpeg', '.jpg', '.m4a', '.mkv', '.mov', '.mp3', '.mp4',
+    '.ogg', '.png', '.pptx', '.rar', '.tgz', '.webm', '.webp', '.whl', '.woff',
+    '.woff2', '.xlsx', '.xz', '.zip', '.zst',
+})
+_ZIP64_LIMIT = ZIP64_LIMIT
+_ZIP_MAX_UINT32 = 0xFFFFFFFF
+_ZIP_MAX_ENTRIES = 0xFFFF
+_ZIP_FLAG_DATA_DESCRIPTOR = 0x08
+_ZIP_FLAG_UTF8 = 0x800
+_ZIP_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_ZIP_CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_ZIP_DATA_DESCRIPTOR = struct.Struct('<4s3L')
+_ZIP64_DATA_DESCRIPTOR = struct.Struct('<4sL2Q')
+_ZIP64_END_RECORD = struct.Struct('<4sQ2H2L4Q')
+_ZIP64_END_LOCATOR = struct.Struct('<4sLQL')
+_ZIP_END_RECORD = struct.Struct('<4s4H2LH')
 
 _LANGUAGE_BY_SUFFIX = {
     '.bash': 'bash',
@@ -810,12 +864,82 @@ def _looks_like_templated_html(path: Path, *, text: str | None = None, raw: byte
     return any(marker in sample for marker in _HTML_TEMPLATE_MARKERS)
 
 
-def list_directory(root_key=None, relative_path=''):
+def _scan_directory_entries(root_path, target_path):
+    """Return sorted ``(is_dir, name, relative_path, dir_entry)`` tuples.
+
+    ``os.scandir`` reports the entry type from the directory read itself, so
+    sorting needs no per-entry syscalls; stat data is fetched lazily for the
+    requested page and cached on the ``DirEntry``. Only symlinks are resolved,
+    to keep their targets inside the root.
+    """
+    base_path = target_path.relative_to(root_path).as_posix()
+    base_prefix = '' if base_path == '.' else f'{base_path}/'
+    scanned = []
+    with os.scandir(target_path) as iterator:
+        for dir_entry in iterator:
+            try:
+                is_dir = dir_entry.is_dir()
+                is_symlink = dir_entry.is_symlink()
+            except OSError:
+                continue
+            if is_symlink:
+                try:
+                    resolved_child = Path(dir_entry.path).resolve(strict=False)
+                    entry_relative_path = resolved_child.relative_to(root_path).as_posix()
+                except (OSError, ValueError):
+                    continue
+                if entry_relative_path == '.':
+                    continue
+            else:
+                entry_relative_path = f'{base_prefix}{dir_entry.name}'
+            scanned.append((not is_dir, dir_entry.name.lower(), dir_entry.name, entry_relative_path, dir_entry))
+    scanned.sort(key=lambda item: (item[0], item[1]))
+    return [(not is_file, name, entry_relative_path, dir_entry) for is_file, _, name, entry_relative_path, dir_entry in scanned]
+
+
+def _cached_directory_entries(root_path, target_path, directory_mtime_ns):
+    cache_key = (str(root_path), str(target_path))
+    now = time.monotonic()
+    with _LIST_CACHE_LOCK:
+        cached = _LIST_CACHE.get(cache_key)
+        if cached is not None and cached['mtime_ns'] == directory_mtime_ns and cached['expires_at'] > now:
+            return cached['entries']
+    entries = _scan_directory_entries(root_path, target_path)
+    with _LIST_CACHE_LOCK:
+        _LIST_CACHE.pop(cache_key, None)
+        _LIST_CACHE[cache_key] = {
+            'mtime_ns': directory_mtime_ns,
+            'expires_at': now + _LIST_CACHE_TTL_SECONDS,
+            'entries': entries,
+        }
+        while len(_LIST_CACHE) > _LIST_CACHE_MAX_DIRECTORIES:
+            _LIST_CACHE.pop(next(iter(_LIST_CACHE)), None)
+    return entries
+
+
+def _normalize_list_window(offset, limit):
+    try:
+        offset = max(0, int(offset or 0))
+    except (TypeError, ValueError):
+        offset = 0
+    try:
+        limit = int(limit) if limit is not None else _MAX_LIST_ENTRIES
+    except (TypeError, ValueError):
+        limit = _MAX_LIST_ENTRIES
+    return offset, min(max(1, limit), _MAX_LIST_ENTRIES)
+
+
+def list_directory(root_key=None, relative_path='', offset=0, limit=None):
     normalized_root, root_path = _normalize_root_key(root_key)
     normalized_path = _normalize_relative_path(relative_path)
     target_path = _resolve_target_path(root_path, normalized_path)
+    offset, limit = _normalize_list_window(offset, limit)
 
-    if not target_path.exists():
+    try:
+        directory_stat = target_path.stat()
+    except OSError:
+        directory_stat = None
+    if directory_stat is None:
         raise FileBrowserError(
             '경로를 찾을 수 없습니다.',
             error_code='path_not_found',
@@ -828,42 +952,36 @@ def list_directory(root_key=None, relative_path=''):
             status_code=400,
         )
 
-    entries = []
-    for child in target_path.iterdir():
-        try:
-            resolved_child = child.resolve(strict=False)
-            resolved_child.relative_to(root_path)
-        except (OSError, ValueError):
-            continue
-
-        is_dir = resolved_child.is_dir()
-        entry_relative_path = _to_relative_path(root_path, resolved_child)
-        if not entry_relative_path:
-            continue
+    try:
+        all_entries = _cached_directory_entries(root_path, target_path, directory_stat.st_mtime_ns)
+    except OSError as exc:
+        raise FileBrowserError(
+            f'폴더를 읽을 수 없습니다: {exc}',
+            error_code='read_error',
+            status_code=500,
+        ) from exc
 
+    entries = []
+    for is_dir, name, entry_relative_path, dir_entry in all_entries[offset:offset + limit]:
         size = None
         modified_at = None
         try:
-            stats = resolved_child.stat()
+            stats = dir_entry.stat()
             modified_at = int(stats.st_mtime)
             if not is_dir:
                 size = int(stats.st_size)
         except OSError:
             pass
-
         entries.append({
-            'name': child.name,
+            'name': name,
             'path': entry_relative_path,
             'type': 'dir' if is_dir else 'file',
             'size': size,
             'modified_at': modified_at,
         })
 
-    entries.sort(key=lambda item: (item.get('type') != 'dir', item.get('name', '').lower()))
-    truncated = len(entries) > _MAX_LIST_ENTRIES
-    if truncated:
-        entries = entries[:_MAX_LIST_ENTRIES]
-
+    total = len(all_entries)
+    next_offset = offset + limit if offset + limit < total else None
     return {
         'root': normalized_root,
         'root_path': str(root_path),
@@ -871,7 +989,74 @@ def list_directory(root_key=None, relative_path=''):
         'parent_path': _to_parent_relative_path(normalized_path),
         'can_go_up': bool(normalized_path),
         'entries': entries,
-        'truncated': truncated,
+        'truncated': next_offset is not None,
+        'offset': offset,
+        'limit': limit,
+        'total': total,
+        'next_offset': next_offset,
+    }
+
+
+def search_files(root_key=None, query='', limit=None):
+    normalized_root, root_path = _normalize_root_key(root_key)
+    normalized_query = ' '.join(str(query or '').replace('\\', '/').split())
+    if not normalized_query:
+        raise FileBrowserError(
+            '검색어를 입력해주세요.',
+            error_code='invalid_query',
+            status_code=400,
+        )
+    if len(normalized_query) > _MAX_SEARCH_QUERY_CHARS:
+        raise FileBrowserError(
+            f'검색어는 {_MAX_SEARCH_QUERY_CHARS}자 이내로 입력해주세요.',
+            error_code='invalid_query',
+            status_code=400,
+        )
+    try:
+        limit = int(limit) if limit is not None else _DEFAULT_SEARCH_RESULTS
+    except (TypeError, ValueError):
+        limit = _DEFAULT_SEARCH_RESULTS
+    limit = min(max(1, limit), _MAX_SEARCH_RESULTS)
+
+    started = time.perf_counter()
+    snapshot = ready_file_index(root_path)
+    if snapshot is None:
+        # The root is being indexed in the background; ask again shortly.
+        return {
+            'root': normalized_root,
+            'root_path': str(root_path),
+            'query': normalized_query,
+            'results': [],
+            'count': 0,
+            'total': 0,
+            'truncated': False,
+            'indexing': True,
+            'indexed_entries': 0,
+            'index_truncated': False,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3),
+        }
+    matches, total = snapshot.search(normalized_query, limit)
+    results = []
+    for index in matches:
+        path = snapshot.paths[index]
+        results.append({
+            'name': path[snapshot.name_starts[index]:],
+            'path': path,
+            'parent_path': _to_parent_relative_path(path),
+            'type': 'dir' if snapshot.is_dir[index] else 'file',
+        })
+    return {
+        'root': normalized_root,
+        'root_path': str(root_path),
+        'query': normalized_query,
+        'results': results,
+        'count': len(results),
+        'total': total,
+        'truncated': total > len(results),
+        'indexing': False,
+        'indexed_entries': len(snapshot),
+        'index_truncated': snapshot.truncated,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 3),
     }
 
 
@@ -1400,7 +1585,358 @@ def read_file_raw(root_key=None, relative_path=''):
     }
 
 
-def build_download_payload(root_key=None, relative_paths=None):
+def _zip_encoded_name(member):
+    try:
+        return member.filename.encode('ascii'), 0
+    except UnicodeEncodeError:
+        return member.filename.encode('utf-8'), _ZIP_FLAG_UTF8
+
+
+def _zip_dos_timestamp(member):
+    year, month, day, hour, minute, second = member.date_time
+    return hour << 11 | minute << 5 | second // 2, (year - 1980) << 9 | month << 5 | day
+
+
+class _ZipStreamWriter:
+    """Lay out a zip archive front to back without ever seeking.
+
+    ``ZipFile`` has no public way to append a member that was already
+    deflated on a worker thread, so local headers, data descriptors and the
+    central directory are written here; ``ZipInfo`` only carries each
+    member's metadata. ZIP64 records are used once a size, offset or entry
+    count passes the classic limits.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self._members = []
+
+    def _local_header(self, member, zip64):
+        name, flags = _zip_encoded_name(member)
+        member.flag_bits |= flags
+        if member.flag_bits & _ZIP_FLAG_DATA_DESCRIPTOR:
+            crc = compress_size = file_size = 0
+        else:
+            crc, compress_size, file_size = member.CRC, member.compress_size, member.file_size
+        extra = b''
+        if zip64:
+            extra = struct.pack('<2H2Q', 1, 16, file_size, compress_size)
+            compress_size = file_size = _ZIP_MAX_UINT32
+            member.extract_version = member.create_version = 45
+        dos_time, dos_date = _zip_dos_timestamp(member)
+        header = _ZIP_LOCAL_HEADER.pack(
+            b'PK\x03\x04', member.extract_version, 0, member.flag_bits, member.compress_type,
+            dos_time, dos_date, crc, compress_size, file_size, len(name), len(extra),
+        )
+        member.header_offset = self.offset
+        return self._advance(header + name + extra)
+
+    def _advance(self, data):
+        self.offset += len(data)
+        return data
+
+    def write_directory(self, member):
+        member.compress_type = ZIP_STORED
+        member.CRC = member.compress_size = member.file_size = 0
+        yield self._local_header(member, False)
+        self._members.append(member)
+
+    def write_deflated(self, member, data):
+        """Write a member whose CRC and sizes are already set on ``member``."""
+        zip64 = max(member.file_size, member.compress_size) > _ZIP64_LIMIT
+        yield self._local_header(member, zip64)
+        yield self._advance(data)
+        self._members.append(member)
+
+    def write_streamed(self, member, source, size_hint):
+        """Compress ``source`` chunk by chunk, then write a data descriptor."""
+        # Same headroom as ZipFile: decide on ZIP64 before the size is known.
+        zip64 = size_hint * 1.05 > _ZIP64_LIMIT
+        member.flag_bits |= _ZIP_FLAG_DATA_DESCRIPTOR
+        yield self._local_header(member, zip64)
+        compressor = None
+        if member.compress_type == ZIP_DEFLATED:
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        crc = 0
+        file_size = 0
+        compress_size = 0
+        while True:
+            chunk = source.read(_ARCHIVE_STREAM_CHUNK_BYTES)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            data = compressor.compress(chunk) if compressor else chunk
+            if data:
+                compress_size += len(data)
+                yield self._advance(data)
+        if compressor:
+            data = compressor.flush()
+            compress_size += len(data)
+            yield self._advance(data)
+        if not zip64 and max(file_size, compress_size) > _ZIP64_LIMIT:
+            raise FileBrowserError(
+                f'압축 중에 파일 크기가 바뀌었습니다: {member.filename}',
+                error_code='download_error',
+                status_code=500,
+            )
+        member.CRC, member.file_size, member.compress_size = crc, file_size, compress_size
+        if zip64:
+            descriptor = _ZIP64_DATA_DESCRIPTOR.pack(b'PK\x07\x08', crc, compress_size, file_size)
+        else:
+            descriptor = _ZIP_DATA_DESCRIPTOR.pack(b'PK\x07\x08', crc, compress_size, file_size)
+        yield self._advance(descriptor)
+        self._members.append(member)
+
+    def _central_header(self, member):
+        name, _ = _zip_encoded_name(member)
+        file_size, compress_size, header_offset = member.file_size, member.compress_size, member.header_offset
+        zip64_fields = []
+        if file_size > _ZIP64_LIMIT:
+            zip64_fields.append(file_size)
+            file_size = _ZIP_MAX_UINT32
+        if compress_size > _ZIP64_LIMIT:
+            zip64_fields.append(compress_size)
+            compress_size = _ZIP_MAX_UINT32
+        if header_offset > _ZIP64_LIMIT:
+            zip64_fields.append(header_offset)
+            header_offset = _ZIP_MAX_UINT32
+        extra = b''
+        if zip64_fields:
+            extra = struct.pack(f'<2H{len(zip64_fields)}Q', 1, 8 * len(zip64_fields), *zip64_fields)
+            member.extract_version = member.create_version = 45
+        dos_time, dos_date = _zip_dos_timestamp(member)
+        return _ZIP_CENTRAL_HEADER.pack(
+            b'PK\x01\x02', member.create_version, member.create_system, member.extract_version, 0,
+            member.flag_bits, member.compress_type, dos_time, dos_date, member.CRC,
+            compress_size, file_size, len(name), len(extra), 0, 0, 0, member.external_attr,
+            header_offset,
+        ) + name + extra
+
+    def finish(self):
+        """Write the central directory and end records."""
+        directory_offset = self.offset
+        directory = b''.join(self._central_header(member) for member in self._members)
+        yield self._advance(directory)
+        count = len(self._members)
+        directory_size = len(directory)
+        if (
+                count >= _ZIP_MAX_ENTRIES
+                or directory_offset > _ZIP64_LIMIT
+                or directory_size > _ZIP64_LIMIT):
+            zip64_end_offset = self.offset
+            yield self._advance(_ZIP64_END_RECORD.pack(
+                b'PK\x06\x06', _ZIP64_END_RECORD.size - 12, 45, 45, 0, 0,
+                count, count, directory_size, directory_offset,
+            ))
+            yield self._advance(_ZIP64_END_LOCATOR.pack(b'PK\x06\x07', 0, zip64_end_offset, 1))
+            count = min(count, _ZIP_MAX_ENTRIES)
+            directory_size = min(directory_size, _ZIP_MAX_UINT32)
+            directory_offset = min(directory_offset, _ZIP_MAX_UINT32)
+        yield self._advance(_ZIP_END_RECORD.pack(
+            b'PK\x05\x06', 0, 0, count, count, directory_size, directory_offset, 0,
+        ))
+
+
+def _archive_compress_type(archive_name):
+    suffix = Path(archive_name).suffix.lower()
+    return ZIP_STORED if suffix in _ARCHIVE_STORED_SUFFIXES else ZIP_DEFLATED
+
+
+def _collect_archive_entries(
+        root_path,
+        targets,
+        *,
+        byte_limit,
+        byte_limit_message,
+        byte_limit_code='file_too_large',
+        entry_limit=None,
+        entry_limit_message='',
+):
+    """Walk and size every archive member before any bytes are written.
+
+    Limit and stat errors must surface as a normal error response, which is
+    no longer possible once a streamed body has started. Members follow the
+    sorted target paths so the same selection always yields the same archive.
+    The returned ``signature`` lists each member with its size and mtime and
+    keys the archive cache.
+    """
+    entries = []
+    signature = []
+    file_count = 0
+    directory_count = 0
+    total_source_bytes = 0
+    ordered_targets = sorted(targets, key=lambda item: item['relative_path'])
+    for entry_path, archive_name, is_directory in _iter_archive_entries(root_path, ordered_targets):
+        if entry_limit is not None and len(entries) >= entry_limit:
+            raise FileBrowserError(
+                entry_limit_message,
+                error_code='archive_too_many_entries',
+                status_code=413,
+            )
+        if is_directory:
+            entries.append((entry_path, archive_name, True, 0))
+            signature.append([archive_name])
+            directory_count += 1
+            continue
+        try:
+            stat = entry_path.stat()
+        except OSError as exc:
+            raise FileBrowserError(
+                f'파일 정보를 확인할 수 없습니다: {archive_name}: {exc}',
+                error_code='read_error',
+                status_code=500,
+            ) from exc
+        source_size = max(0, int(stat.st_size))
+        total_source_bytes += source_size
+        if total_source_bytes > byte_limit:
+            raise FileBrowserError(
+                byte_limit_message,
+                error_code=byte_limit_code,
+                status_code=413,
+            )
+        entries.append((entry_path, archive_name, False, source_size))
+        signature.append([archive_name, source_size, int(stat.st_mtime_ns)])
+        file_count += 1
+    return entries, signature, file_count, directory_count, total_source_bytes
+
+
+def _archive_cache_inside_browser_root(directory):
+    for root_path in _get_browser_roots().values():
+        try:
+            directory.relative_to(root_path)
+        except ValueError:
+            continue
+        return True
+    return False
+
+
+def _get_archive_cache():
+    directory = _ARCHIVE_CACHE_DIR.expanduser().resolve(strict=False)
+    max_bytes = _ARCHIVE_CACHE_MAX_BYTES
+    if max_bytes > 0 and _archive_cache_inside_browser_root(directory):
+        # Cached archives would be browsable, searchable and archived again.
+        _LOGGER.warning('archive cache disabled: %s is inside a file browser root', directory)
+        max_bytes = 0
+    cache_key = (str(directory), max_bytes)
+    with _ARCHIVE_CACHES_LOCK:
+        cache = _ARCHIVE_CACHES.get(cache_key)
+        if cache is None:
+            cache = ArchiveCache(directory, max_bytes)
+            _ARCHIVE_CACHES[cache_key] = cache
+    return cache
+
+
+def _archive_key(normalized_root, signature):
+    return archive_cache_key(_ARCHIVE_CACHE_FORMAT, normalized_root, signature)
+
+
+def _deflate_archive_member(entry_path, archive_name):
+    """Compress one file into a finished zip member; runs on a worker thread.
+
+    zlib releases the GIL while it compresses, so members deflate in
+    parallel. The deflate stream matches what ``ZipFile`` itself produces.
+    """
+    member = ZipInfo.from_file(entry_path, arcname=archive_name)
+    member.compress_type = _archive_compress_type(archive_name)
+    compressor = None
+    if member.compress_type == ZIP_DEFLATED:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    parts = []
+    crc = 0
+    file_size = 0
+    with open(entry_path, 'rb') as source:
+        while True:
+            chunk = source.read(_ARCHIVE_STREAM_CHUNK_BYTES)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            parts.append(compressor.compress(chunk) if compressor else chunk)
+    if compressor:
+        parts.append(compressor.flush())
+    data = b''.join(parts)
+    member.CRC = crc
+    member.file_size = file_size
+    member.compress_size = len(data)
+    return member, data
+
+
+def _get_archive_compress_pool(workers):
+    """Return the process-wide deflate pool with ``workers`` threads.
+
+    Every archive request shares it, so concurrent downloads queue for the
+    same threads instead of each starting their own.
+    """
+    with _ARCHIVE_COMPRESS_POOLS_LOCK:
+        pool = _ARCHIVE_COMPRESS_POOLS.get(workers)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='codex-zip')
+            _ARCHIVE_COMPRESS_POOLS[workers] = pool
+    return pool
+
+
+def _iter_zip_stream(entries, *, workers=None):
+    """Yield a zip archive of ``entries`` while reading each file in chunks.
+
+    With more than one worker, small and medium files are deflated on the
+    shared pool a bounded window ahead of the writer, and members are still
+    written in ``entries`` order so the archive is deterministic.
+    """
+    workers = _ARCHIVE_COMPRESS_WORKERS if workers is None else max(1, int(workers))
+    pool = _get_archive_compress_pool(workers) if workers > 1 else None
+    writer = _ZipStreamWriter()
+    pending = deque()
+    pending_bytes = 0
+
+    def _write_next():
+        nonlocal pending_bytes
+        entry_path, archive_name, is_directory, size, future = pending.popleft()
+        if future is not None:
+            pending_bytes -= size
+            yield from writer.write_deflated(*future.result())
+        elif is_directory:
+            yield from writer.write_directory(ZipInfo.from_file(entry_path, arcname=archive_name))
+        else:
+            member = ZipInfo.from_file(entry_path, arcname=archive_name)
+            member.compress_type = _archive_compress_type(archive_name)
+            with open(entry_path, 'rb') as source:
+                yield from writer.write_streamed(member, source, size)
+
+    try:
+        for entry_path, archive_name, is_directory, size in entries:
+            future = None
+            if pool is not None and not is_directory and size <= _ARCHIVE_PARALLEL_MEMBER_MAX_BYTES:
+                while pending and (
+                        len(pending) >= workers * 2
+                        or pending_bytes + size > _ARCHIVE_PARALLEL_PENDING_MAX_BYTES):
+                    yield from _write_next()
+                future = pool.submit(_deflate_archive_member, entry_path, archive_name)
+                pending_bytes += size
+            pending.append((entry_path, archive_name, is_directory, size, future))
+            if future is None:
+                # Streamed members and directories keep their place in order.
+                while pending:
+                    yield from _write_next()
+        while pending:
+            yield from _write_next()
+        yield from writer.finish()
+    finally:
+        # An abandoned download must not leave queued work on the shared pool.
+        for *_, future in pending:
+            if future is not None:
+                future.cancel()
+
+
+def build_download_stream(root_key=None, relative_paths=None):
+    """Prepare a download without reading file contents into memory.
+
+    A single file is returned as ``file_path`` for the caller to send with
+    range support. Anything else is returned as ``chunks``, a generator that
+    produces the zip archive as it reads each member. A cached archive is
+    also returned as ``file_path``; it stays pinned until
+    :func:`release_download_stream` is called once the response is closed.
+    """
     normalized_root, root_path, targets = _resolve_archive_targets(root_key, relative_paths)
 
     contains_directories = any(item.get('type') == 'dir' for item in targets)
@@ -1424,14 +1960,6 @@ def build_download_payload(root_key=None, relative_paths=None):
 
     if len(targets) == 1 and not contains_directories:
         target = targets[0]
-        try:
-            content = target['target_path'].read_bytes()
-        except OSError as exc:
-            raise FileBrowserError(
-                f'파일을 읽을 수 없습니다: {exc}',
-                error_code='read_error',
-                status_code=500,
-            ) from exc
         mime_type = mimetypes.guess_type(target['name'])[0] or 'application/octet-stream'
         return {
             'root': normalized_root,
@@ -1440,51 +1968,20 @@ def build_download_payload(root_key=None, relative_paths=None):
             'count': 1,
             'mime_type': mime_type,
             'download_name': target['name'],
-            'content': content,
+            'file_path': str(target['target_path']),
+            'size': total_bytes,
             'is_archive': False,
         }
 
-    buffer = io.BytesIO()
-    archive_paths = []
-    file_count = 0
-    directory_count = 0
-    total_source_bytes = 0
-    try:
-        with ZipFile(buffer, 'w', compression=ZIP_DEFLATED) as archive:
-            for entry_path, archive_name, is_directory in _iter_archive_entries(root_path, targets):
-                archive_paths.append(archive_name)
-                if is_directory:
-                    archive.write(entry_path, arcname=archive_name)
-                    directory_count += 1
-                    continue
-                try:
-                    source_size = int(entry_path.stat().st_size)
-                except OSError as exc:
-                    raise FileBrowserError(
-                        f'파일 정보를 확인할 수 없습니다: {archive_name}: {exc}',
-                        error_code='read_error',
-                        status_code=500,
-                    ) from exc
-                total_source_bytes += max(0, source_size)
-                if total_source_bytes > _MAX_MULTI_DOWNLOAD_TOTAL_BYTES:
-                    raise FileBrowserError(
-                        f'선택한 파일과 폴더의 전체 다운로드 크기 제한({_format_byte_limit(_MAX_MULTI_DOWNLOAD_TOTAL_BYTES)})을 초과했습니다.',
-                        error_code='file_too_large',
-                        status_code=413,
-                    )
-                archive.write(entry_path, arcname=archive_name)
-                file_count += 1
-    except FileBrowserError:
-        raise
-    except OSError as exc:
-        raise FileBrowserError(
-            f'압축 파일을 만들지 못했습니다: {exc}',
-            error_code='download_error',
-            status_code=500,
-        ) from exc
-
-    content = buffer.getvalue()
-    return {
+    entries, signature, file_count, directory_count, total_source_bytes = _collect_archive_entries(
+        root_path,
+        targets,
+        byte_limit=_MAX_MULTI_DOWNLOAD_TOTAL_BYTES,
+        byte_limit_message=(
+            f'선택한 파일과 폴더의 전체 다운로드 크기 제한({_format_byte_limit(_MAX_MULTI_DOWNLOAD_TOTAL_BYTES)})을 초과했습니다.'
+        ),
+    )
+    result = {
         'root': normalized_root,
         'root_path': str(root_path),
         'paths': [item['relative_path'] for item in targets],
@@ -1492,95 +1989,163 @@ def build_download_payload(root_key=None, relative_paths=None):
         'target_count': len(targets),
         'file_count': file_count,
         'directory_count': directory_count,
-        'entry_count': len(archive_paths),
+        'entry_count': len(entries),
         'source_size': total_source_bytes,
-        'archive_size': len(content),
         'mime_type': 'application/zip',
         'download_name': _build_download_archive_name(),
-        'content': content,
         'is_archive': True,
     }
+    cache = _get_archive_cache()
+    archive_key = _archive_key(normalized_root, signature)
+    cached_path = cache.lookup(archive_key, pin=True)
+    if cached_path is not None:
+        result['file_path'] = str(cached_path)
+        result['archive_cache_key'] = archive_key
+        result['cached'] = True
+        return result
+    # A miss streams straight to the client and saves a copy on the way.
+    result['chunks'] = cache.store_stream(
+        archive_key,
+        _iter_zip_stream(entries),
+        size_hint=total_source_bytes,
+    )
+    result['cached'] = False
+    return result
+
+
+def build_download_payload(root_key=None, relative_paths=None):
+    """Buffered form of :func:`build_download_stream` returning ``content`` bytes."""
+    result = build_download_stream(root_key=root_key, relative_paths=relative_paths)
+    if not result['is_archive']:
+        try:
+            content = Path(result.pop('file_path')).read_bytes()
+        except OSError as exc:
+            raise FileBrowserError(
+                f'파일을 읽을 수 없습니다: {exc}',
+                error_code='read_error',
+                status_code=500,
+            ) from exc
+        result.pop('size', None)
+        result['content'] = content
+        return result
+
+    try:
+        if 'file_path' in result:
+            content = Path(result.pop('file_path')).read_bytes()
+        else:
+            content = b''.join(result.pop('chunks'))
+    except OSError as exc:
+        raise FileBrowserError(
+            f'압축 파일을 만들지 못했습니다: {exc}',
+            error_code='download_error',
+            status_code=500,
+        ) from exc
+    result['archive_size'] = len(content)
+    result['content'] = content
+    return result
 
 
 def build_mail_archive_payload(root_key=None, relative_paths=None, *, max_bytes=None, max_entries=None):
+    """Build the mail attachment archive on disk and return its ``archive_path``.
+
+    The archive comes from the shared archive cache, so mailing a selection
+    that was just downloaded (or mailed) reuses the same file. The entry stays
+    pinned until :func:`release_mail_archive_payload` is called, so eviction
+    cannot remove it before the mail is sent. When the archive is not cached
+    (cache disabled or over budget) it is built in memory and returned as
+    ``content``.
+    """
     normalized_root, root_path, targets = _resolve_archive_targets(root_key, relative_paths)
     byte_limit = int(max_bytes) if max_bytes is not None else 20 * 1024 * 1024
     entry_limit = int(max_entries) if max_entries is not None else 5000
-    buffer = io.BytesIO()
-    archive_paths = []
-    file_count = 0
-    directory_count = 0
-    total_source_bytes = 0
 
+    entries, signature, file_count, directory_count, total_source_bytes = _collect_archive_entries(
+        root_path,
+        targets,
+        byte_limit=byte_limit,
+        byte_limit_message=f'메일 첨부 크기 제한({_format_byte_limit(byte_limit)})을 초과했습니다.',
+        byte_limit_code='archive_too_large',
+        entry_limit=entry_limit,
+        entry_limit_message=f'메일 첨부 항목 수 제한({entry_limit}개)을 초과했습니다.',
+    )
+    if file_count <= 0 and directory_count <= 0:
+        raise FileBrowserError(
+            '첨부할 파일 또는 폴더를 찾을 수 없습니다.',
+            error_code='empty_archive',
+            status_code=400,
+        )
+
+    cache = _get_archive_cache()
+    archive_key = _archive_key(normalized_root, signature)
+    archive_path = None
+    content = None
     try:
-        with ZipFile(buffer, 'w', compression=ZIP_DEFLATED) as archive:
-            for entry_path, archive_name, is_directory in _iter_archive_entries(root_path, targets):
-                if len(archive_paths) >= entry_limit:
-                    raise FileBrowserError(
-                        f'메일 첨부 항목 수 제한({entry_limit}개)을 초과했습니다.',
-                        error_code='archive_too_many_entries',
-                        status_code=413,
-                    )
-                archive_paths.append(archive_name)
-                if is_directory:
-                    archive.write(entry_path, arcname=archive_name)
-                    directory_count += 1
-                    continue
-                try:
-                    source_size = int(entry_path.stat().st_size)
-                except OSError as exc:
-                    raise FileBrowserError(
-                        f'파일 정보를 확인할 수 없습니다: {archive_name}: {exc}',
-                        error_code='read_error',
-                        status_code=500,
-                    ) from exc
-                total_source_bytes += max(0, source_size)
-                if total_source_bytes > byte_limit:
-                    raise FileBrowserError(
-                        f'메일 첨부 크기 제한({_format_byte_limit(byte_limit)})을 초과했습니다.',
-                        error_code='archive_too_large',
-                        status_code=413,
-                    )
-                archive.write(entry_path, arcname=archive_name)
-                file_count += 1
-    except FileBrowserError:
-        raise
+        archive_path = cache.lookup(archive_key, pin=True) or cache.store(
+            archive_key,
+            _iter_zip_stream(entries),
+            size_hint=total_source_bytes,
+            pin=True,
+        )
+        if archive_path is None:
+            content = b''.join(_iter_zip_stream(entries))
+            archive_size = len(content)
+        else:
+            archive_size = int(archive_path.stat().st_size)
     except OSError as exc:
+        if archive_path is not None:
+            cache.release(archive_key)
         raise FileBrowserError(
             f'메일 첨부 압축 파일을 만들지 못했습니다: {exc}',
             error_code='archive_error',
             status_code=500,
         ) from exc
 
-    content = buffer.getvalue()
-    if len(content) > byte_limit:
+    if archive_size > byte_limit:
+        if archive_path is not None:
+            cache.release(archive_key)
         raise FileBrowserError(
             f'메일 첨부 압축 파일 크기 제한({_format_byte_limit(byte_limit)})을 초과했습니다.',
             error_code='archive_too_large',
             status_code=413,
         )
-    if file_count <= 0 and directory_count <= 0:
-        raise FileBrowserError(
-            '첨부할 파일 또는 폴더를 찾을 수 없습니다.',
-            error_code='empty_archive',
-            status_code=400,
-        )
 
-    return {
+    result = {
         'root': normalized_root,
         'root_path': str(root_path),
         'paths': [item['relative_path'] for item in targets],
         'target_count': len(targets),
         'file_count': file_count,
         'directory_count': directory_count,
-        'entry_count': len(archive_paths),
+        'entry_count': len(entries),
         'source_size': total_source_bytes,
-        'archive_size': len(content),
+        'archive_size': archive_size,
         'mime_type': 'application/zip',
         'download_name': _build_mail_archive_name(),
-        'content': content,
         'is_archive': True,
     }
+    if archive_path is not None:
+        result['archive_path'] = str(archive_path)
+        result['archive_cache_key'] = archive_key
+    else:
+        result['content'] = content
+    return result
+
+
+def _release_archive_cache_pin(result):
+    archive_key = result.get('archive_cache_key') if isinstance(result, dict) else None
+    if archive_key:
+        result.pop('archive_cache_key', None)
+        _get_archive_cache().release(archive_key)
+
+
+def release_download_stream(result):
+    """Unpin the cached archive behind a :func:`build_download_stream` result."""
+    _release_archive_cache_pin(result)
+
+
+def release_mail_archive_payload(archive):
+    """Unpin the cached archive behind a :func:`build_mail_archive_payload` result."""
+    _release_archive_cache_pin(archive)
 
 
 def delete_files(root_key=None, relative_paths=None):
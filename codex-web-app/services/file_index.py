@@ -0,0 +1,317 @@
+"""Recursive file-name index used by the file browser search."""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import threading
+import time
+from bisect import bisect_right
+from pathlib import Path
+
+_LOGGER = logging.getLogger(__name__)
+
+INDEX_MAX_ENTRIES = 200_000
+INDEX_REFRESH_SECONDS = 30.0
+# Roots nobody searched for this long are no longer refreshed in the background.
+INDEX_IDLE_SECONDS = 600.0
+# Fuzzy matching checks each path in Python, so bound both the query and the
+# number of paths one fallback search may walk.
+FUZZY_MAX_QUERY_CHARS = 32
+FUZZY_MAX_SCANNED_PATHS = 50_000
+# A directory modified this recently may change again within the same mtime
+# tick, so its listing is rescanned on the next refresh instead of trusted.
+_RACY_MTIME_NS = 2_000_000_000
+_SKIPPED_DIRECTORY_NAMES = frozenset({
+    '.git',
+    '.hg',
+    '.mypy_cache',
+    '.pytest_cache',
+    '.svn',
+    '.venv',
+    '__pycache__',
+    'node_modules',
+    'venv',
+})
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+_INDEX_WORKER_CONDITION = threading.Condition()
+_INDEX_WORKER_PENDING = set()
+_INDEX_WORKER_STARTED = False
+
+
+class _IndexSnapshot:
+    """Search view of one refresh: lower-cased paths joined into one string.
+
+    Substring search runs ``str.find`` over the joined text in C and maps hits
+    back to entries with ``bisect``, so a query does not loop over every path
+    in Python. Offsets come from the lower-cased paths, which can be longer
+    than the originals (``'İ'.lower()`` is two characters).
+    """
+
+    __slots__ = ('paths', 'is_dir', 'name_starts', 'lower_paths', 'offsets', 'text', 'truncated', 'built_at')
+
+    def __init__(self, entries, *, truncated=False, built_at=None):
+        entries = sorted(entries)
+        self.paths = [path for path, _ in entries]
+        self.is_dir = [is_dir for _, is_dir in entries]
+        self.name_starts = [path.rfind('/') + 1 for path in self.paths]
+        self.lower_paths = [path.lower() for path in self.paths]
+        offsets = []
+        position = 0
+        for lower_path in self.lower_paths:
+            offsets.append(position)
+            position += len(lower_path) + 1
+        self.offsets = offsets
+        self.text = '\n'.join(self.lower_paths)
+        self.truncated = bool(truncated)
+        self.built_at = built_at
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _entry_at(self, position):
+        return bisect_right(self.offsets, position) - 1
+
+    def _substring_candidates(self, token):
+        text = self.text
+        found = []
+        start = text.find(token)
+        while start >= 0:
+            index = self._entry_at(start)
+            found.append(index)
+            # Resume after this entry; one hit per path is enough.
+            next_start = max(start + 1, self.offsets[index] + len(self.lower_paths[index]) + 1)
+            start = text.find(token, next_start)
+        return found
+
+    def _fuzzy_candidates(self, query):
+        """Return paths containing the letters of ``query`` in order.
+
+        Each path is checked with ``str.find`` from the previous hit, so the
+        cost is linear in the path length whatever the query looks like.
+        """
+        if len(query) > FUZZY_MAX_QUERY_CHARS:
+            return []
+        text = self.text
+        if any(text.find(char) < 0 for char in set(query)):
+            return []
+        found = []
+        for index, path in enumerate(self.lower_paths[:FUZZY_MAX_SCANNED_PATHS]):
+            position = 0
+            for char in query:
+                position = path.find(char, position)
+                if position < 0:
+                    break
+                position += 1
+            else:
+                found.append(index)
+        return found
+
+    def _rank(self, index, tokens, fuzzy):
+        path = self.paths[index]
+        name = path[self.name_starts[index]:].lower()
+        query = tokens[0] if len(tokens) == 1 else ''
+        if fuzzy:
+            tier = 5
+        elif query and name == query:
+            tier = 0
+        elif query and name.startswith(query):
+            tier = 1
+        elif all(token in name for token in tokens):
+            tier = 2
+        else:
+            tier = 3
+        return (tier, len(path), index)
+
+    def search(self, query, limit):
+        """Return ``(matches, total)`` for ``query``; ``matches`` holds indexes.
+
+        Whitespace-separated terms must all occur in the path. When nothing
+        matches that way, the query falls back to an in-order character
+        (fuzzy) match over the first ``FUZZY_MAX_SCANNED_PATHS`` paths. Exact
+        and prefix file-name hits rank first, then shorter paths.
+        """
+        tokens = [token for token in str(query or '').lower().split() if token]
+        if not tokens or not self.paths:
+            return [], 0
+        seed = max(tokens, key=len)
+        candidates = self._substring_candidates(seed)
+        if len(tokens) > 1:
+            lower_paths = self.lower_paths
+            candidates = [
+                index for index in candidates
+                if all(token in lower_paths[index] for token in tokens)
+            ]
+        fuzzy = False
+        if not candidates:
+            fuzzy = True
+            candidates = self._fuzzy_candidates(''.join(tokens))
+        ranked = heapq.nsmallest(
+            max(1, int(limit)),
+            (self._rank(index, tokens, fuzzy) for index in candidates),
+        )
+        return [item[-1] for item in ranked], len(candidates)
+
+
+class FileIndex:
+    """Recursive listing of one root, refreshed incrementally.
+
+    Each directory remembers its mtime and child names. A refresh stats every
+    known directory but only re-reads the ones whose mtime moved, so an
+    unchanged tree costs one ``stat`` per directory rather than per file.
+    Symlinked directories are listed but not followed.
+    """
+
+    def __init__(self, root_path, *, max_entries=INDEX_MAX_ENTRIES):
+        self.root_path = Path(root_path)
+        self.max_entries = int(max_entries)
+        self._refresh_lock = threading.Lock()
+        self._directories = {}
+        self._snapshot = None
+        self.last_used = time.monotonic()
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def is_stale(self, now=None):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return True
+        now = time.monotonic() if now is None else now
+        return now - snapshot.built_at >= INDEX_REFRESH_SECONDS
+
+    def _scan_directory(self, absolute_path):
+        directories = []
+        files = []
+        with os.scandir(absolute_path) as iterator:
+            for entry in iterator:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.name)
+                    elif entry.is_dir():
+                        # Symlinked directory: searchable, not descended into.
+                        files.append((entry.name, True))
+                    else:
+                        files.append((entry.name, False))
+                except OSError:
+                    continue
+        return tuple(directories), tuple(files)
+
+    def refresh(self):
+        """Bring the index up to date and return the new snapshot."""
+        with self._refresh_lock:
+            previous = self._directories
+            directories = {}
+            entries = []
+            changed = self._snapshot is None
+            truncated = False
+            now_ns = time.time_ns()
+            stack = ['']
+            while stack:
+                relative_dir = stack.pop()
+                absolute_dir = self.root_path / relative_dir if relative_dir else self.root_path
+                try:
+                    mtime_ns = os.stat(absolute_dir).st_mtime_ns
+                except OSError:
+                    changed = True
+                    continue
+                cached = previous.get(relative_dir)
+                if cached is not None and cached[0] == mtime_ns:
+                    children = cached[1:]
+                else:
+                    try:
+                        children = self._scan_directory(absolute_dir)
+                    except OSError:
+                        changed = True
+                        continue
+                    changed = True
+                trusted_mtime = mtime_ns if now_ns - mtime_ns >= _RACY_MTIME_NS else None
+                directories[relative_dir] = (trusted_mtime, *children)
+                prefix = f'{relative_dir}/' if relative_dir else ''
+                child_directories, child_files = children
+                for name in child_directories:
+                    entries.append((f'{prefix}{name}', True))
+                    if name not in _SKIPPED_DIRECTORY_NAMES:
+                        stack.append(f'{prefix}{name}')
+                for name, is_dir in child_files:
+                    entries.append((f'{prefix}{name}', is_dir))
+                if len(entries) >= self.max_entries:
+                    truncated = True
+                    entries = entries[:self.max_entries]
+                    break
+            if len(directories) != len(previous):
+                changed = True
+            self._directories = directories
+            snapshot = self._snapshot
+            if changed or snapshot is None or snapshot.truncated != truncated:
+                snapshot = _IndexSnapshot(entries, truncated=truncated, built_at=time.monotonic())
+            else:
+                snapshot.built_at = time.monotonic()
+            self._snapshot = snapshot
+            return snapshot
+
+
+def get_file_index(root_path):
+    key = str(root_path)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            index = FileIndex(root_path)
+            _INDEXES[key] = index
+    return index
+
+
+def _index_worker_loop():
+    while True:
+        with _INDEX_WORKER_CONDITION:
+            while not _INDEX_WORKER_PENDING:
+                if not _INDEX_WORKER_CONDITION.wait(timeout=INDEX_REFRESH_SECONDS):
+                    now = time.monotonic()
+                    with _INDEXES_LOCK:
+                        active = [
+                            index for index in _INDEXES.values()
+                            if now - index.last_used < INDEX_IDLE_SECONDS and index.is_stale(now)
+                        ]
+                    _INDEX_WORKER_PENDING.update(active)
+            pending = list(_INDEX_WORKER_PENDING)
+            _INDEX_WORKER_PENDING.clear()
+        for index in pending:
+            try:
+                index.refresh()
+            except Exception:
+                _LOGGER.exception('File index refresh failed (root=%s)', index.root_path)
+
+
+def request_index_refresh(index):
+    global _INDEX_WORKER_STARTED
+    with _INDEX_WORKER_CONDITION:
+        _INDEX_WORKER_PENDING.add(index)
+        _INDEX_WORKER_CONDITION.notify()
+        if _INDEX_WORKER_STARTED:
+            return
+        worker = threading.Thread(
+            target=_index_worker_loop,
+            name='codex-file-index-worker',
+            daemon=True,
+        )
+        worker.start()
+        _INDEX_WORKER_STARTED = True
+
+
+def ready_file_index(root_path):
+    """Return a searchable snapshot for ``root_path``, or None while it builds.
+
+    The first search of a root only queues the build on the worker, so a
+    request never walks the tree itself. Afterwards a stale snapshot is still
+    answered immediately while the worker refreshes it.
+    """
+    index = get_file_index(root_path)
+    index.last_used = time.monotonic()
+    snapshot = index.snapshot
+    if snapshot is None or index.is_stale():
+        request_index_refresh(index)
+    return snapshot
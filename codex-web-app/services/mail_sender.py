@@ -7,6 +7,7 @@ import ssl
 from email.header import Header
 from email.message import EmailMessage
 from email.utils import formataddr, getaddresses, parseaddr
+from pathlib import Path
 
 from ..config import (
     CODEX_MAIL_FROM,
@@ -176,6 +177,12 @@ def _format_sender(sender):
 def build_mail_message(*, to, cc=None, bcc=None, subject='', body='', archive_payload=None):
     archive = archive_payload if isinstance(archive_payload, dict) else {}
     archive_content = archive.get('content') or b''
+    archive_path = str(archive.get('archive_path') or '').strip()
+    if archive_path:
+        try:
+            archive_content = Path(archive_path).read_bytes()
+        except OSError:
+            archive_content = b''
     archive_name = str(archive.get('download_name') or 'codex-mail.zip').strip() or 'codex-mail.zip'
     if not isinstance(archive_content, (bytes, bytearray)) or not archive_content:
         raise MailSendError(
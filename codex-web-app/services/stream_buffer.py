@@ -0,0 +1,199 @@
+"""Append-friendly text buffers for live Codex stream output."""
+
+from __future__ import annotations
+
+import tempfile
+from bisect import bisect_right
+
+_MERGE_CHUNK_CHARS = 4096
+_SPILL_FLUSH_CHARS = 64 * 1024
+DEFAULT_SPILL_THRESHOLD_CHARS = 2 * 1024 * 1024
+
+
+class StreamTextBuffer:
+    """Chunked text buffer with O(1) appends and offset-addressable reads.
+
+    Small appends are merged into chunks of a few KB so token-sized deltas do
+    not become one list entry each. Once the buffer holds more than
+    ``spill_threshold`` characters its contents move to an anonymous temp file
+    and only a short in-memory tail is kept, so a long agent run cannot grow
+    the server's resident memory without bound.
+
+    Whether any non-blank text was appended is tracked as text arrives so
+    hot-path checks never read the whole text.
+
+    The buffer is not thread-safe; callers hold the stream lock.
+    """
+
+    __slots__ = (
+        '_chunks',
+        '_chunk_starts',
+        '_memory_chars',
+        '_length',
+        '_spill_threshold',
+        '_file',
+        '_file_starts',
+        '_file_offsets',
+        '_file_chars',
+        '_file_bytes',
+        '_has_visible_text',
+    )
+
+    def __init__(self, text='', *, spill_threshold=DEFAULT_SPILL_THRESHOLD_CHARS):
+        self._chunks = []
+        self._chunk_starts = []
+        self._memory_chars = 0
+        self._length = 0
+        self._spill_threshold = max(_SPILL_FLUSH_CHARS, int(spill_threshold or 0))
+        self._file = None
+        self._file_starts = []
+        self._file_offsets = []
+        self._file_chars = 0
+        self._file_bytes = 0
+        self._has_visible_text = False
+        if text:
+            self.append(text)
+
+    @property
+    def spilled(self):
+        return self._file is not None
+
+    @property
+    def has_visible_text(self):
+        """Whether the text is non-empty after ``strip()``."""
+        return self._has_visible_text
+
+    def append(self, text):
+        text = str(text or '')
+        if not text:
+            return
+        if self._chunks and len(self._chunks[-1]) < _MERGE_CHUNK_CHARS:
+            self._chunks[-1] += text
+        else:
+            self._chunks.append(text)
+            self._chunk_starts.append(self._length)
+        self._length += len(text)
+        self._memory_chars += len(text)
+        if not self._has_visible_text and text.strip():
+            self._has_visible_text = True
+        limit = _SPILL_FLUSH_CHARS if self._file is not None else self._spill_threshold
+        if self._memory_chars > limit:
+            self._flush_to_file()
+
+    def slice(self, start=0, end=None):
+        length = self._length
+        start = min(max(0, int(start or 0)), length)
+        end = length if end is None else min(max(start, int(end)), length)
+        if start >= end:
+            return ''
+        parts = []
+        if start < self._file_chars:
+            parts.append(self._read_file_range(start, min(end, self._file_chars)))
+        if end > self._file_chars and self._chunks:
+            parts.append(self._read_memory_range(max(start, self._file_chars), end))
+        return ''.join(parts)
+
+    def getvalue(self):
+        if self._file is None:
+            if not self._chunks:
+                return ''
+            if len(self._chunks) > 1:
+                self._chunks = [''.join(self._chunks)]
+                self._chunk_starts = [0]
+            return self._chunks[0]
+        return self.slice(0)
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+            self._file_starts = []
+            self._file_offsets = []
+            self._file_chars = 0
+            self._file_bytes = 0
+
+    def _flush_to_file(self):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix='codex-stream-')
+        self._file.seek(0, 2)
+        for chunk_start, chunk in zip(self._chunk_starts, self._chunks):
+            encoded = chunk.encode('utf-8', 'surrogatepass')
+            self._file_starts.append(chunk_start)
+            self._file_offsets.append(self._file_bytes)
+            self._file.write(encoded)
+            self._file_bytes += len(encoded)
+            self._file_chars = chunk_start + len(chunk)
+        self._file.flush()
+        self._chunks = []
+        self._chunk_starts = []
+        self._memory_chars = 0
+
+    def _read_file_range(self, start, end):
+        first = bisect_right(self._file_starts, start) - 1
+        last = bisect_right(self._file_starts, end - 1)
+        byte_start = self._file_offsets[first]
+        byte_end = self._file_offsets[last] if last < len(self._file_offsets) else self._file_bytes
+        self._file.seek(byte_start)
+        text = self._file.read(byte_end - byte_start).decode('utf-8', 'surrogatepass')
+        base = self._file_starts[first]
+        return text[start - base:end - base]
+
+    def _read_memory_range(self, start, end):
+        first = bisect_right(self._chunk_starts, start) - 1
+        parts = []
+        for index in range(max(first, 0), len(self._chunks)):
+            chunk_start = self._chunk_starts[index]
+            if chunk_start >= end:
+                break
+            chunk = self._chunks[index]
+            parts.append(chunk[max(0, start - chunk_start):end - chunk_start])
+        return ''.join(parts)
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def __str__(self):
+        return self.getvalue()
+
+    def __contains__(self, item):
+        return str(item) in self.getvalue()
+
+    def __eq__(self, other):
+        if isinstance(other, StreamTextBuffer):
+            return self.getvalue() == other.getvalue()
+        if isinstance(other, str):
+            return self.getvalue() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __deepcopy__(self, memo):
+        # Snapshots of a stream (`get_codex_stream`) only need the text.
+        return self.getvalue()
+
+    def __del__(self):
+        self.close()
+
+
+def stream_text(value):
+    if isinstance(value, StreamTextBuffer):
+        return value.getvalue()
+    return '' if value is None else str(value)
+
+
+def stream_text_has_visible_text(value):
+    if isinstance(value, StreamTextBuffer):
+        return value.has_visible_text
+    return bool(stream_text(value).strip())
+
+
+def stream_text_slice(value, start=0):
+    if isinstance(value, StreamTextBuffer):
+        return value.slice(start)
+    return stream_text(value)[max(0, int(start or 0)):]
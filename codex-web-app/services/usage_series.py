@@ -0,0 +1,71 @@
+"""Keyed time-series containers for usage history samples."""
+
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+
+
+class KeyedSeries:
+    """Samples addressed by a sortable key, kept in key order.
+
+    Lookups go through a dict and the ordered key list is maintained with
+    ``bisect``, so an upsert costs O(log n) comparisons. New samples almost
+    always carry the latest bucket and land at the end of the list, so the
+    insert itself rarely moves anything. ``trim`` drops the oldest keys to
+    enforce retention.
+
+    The series is not thread-safe; callers hold the usage history lock.
+    """
+
+    __slots__ = ('_key_func', '_keys', '_items')
+
+    def __init__(self, key_func, samples=(), *, presorted=False):
+        self._key_func = key_func
+        self._keys = []
+        self._items = {}
+        if presorted:
+            for sample in samples:
+                key = key_func(sample)
+                if key not in self._items:
+                    self._keys.append(key)
+                self._items[key] = sample
+        else:
+            for sample in samples:
+                self.put(sample)
+
+    def key_for(self, sample):
+        return self._key_func(sample)
+
+    def get(self, key, default=None):
+        return self._items.get(key, default)
+
+    def put(self, sample):
+        key = self._key_func(sample)
+        if key not in self._items:
+            if not self._keys or key > self._keys[-1]:
+                self._keys.append(key)
+            else:
+                insort(self._keys, key)
+        self._items[key] = sample
+
+    def trim(self, limit):
+        """Drop the oldest samples so at most ``limit`` remain; return how many went."""
+        excess = len(self._keys) - max(0, int(limit))
+        if excess <= 0:
+            return 0
+        for key in self._keys[:excess]:
+            del self._items[key]
+        del self._keys[:excess]
+        return excess
+
+    def samples(self, start_key=None):
+        """Return samples in key order, optionally from ``start_key`` onwards."""
+        start = 0 if start_key is None else bisect_left(self._keys, start_key)
+        items = self._items
+        return [items[key] for key in self._keys[start:]]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._items
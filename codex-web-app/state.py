@@ -1,6 +1,117 @@
 """Shared mutable state for Codex chat server."""
 
 import threading
+import time
+
+
+class InstrumentedLock:
+    """Non-reentrant lock that counts acquisitions which had to wait."""
+
+    __slots__ = ('_lock', 'acquisitions', 'contended', 'wait_seconds')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            self.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+        started = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        # Counters are only touched while the lock is held.
+        self.acquisitions += 1
+        self.contended += 1
+        self.wait_seconds += time.perf_counter() - started
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def stats(self):
+        return {
+            'acquisitions': self.acquisitions,
+            'contended': self.contended,
+            'wait_ms': round(self.wait_seconds * 1000, 3),
+        }
+
+
+class _StreamCondition(threading.Condition):
+    def __init__(self):
+        self.lock = InstrumentedLock()
+        super().__init__(self.lock)
+
 
 codex_streams = {}
-codex_streams_lock = threading.Lock()
+# Registry lock: guards membership of `codex_streams` and per-session decisions
+# such as "is a stream already running". Field updates on a single stream use
+# that stream's own condition from `codex_stream_condition()`. Lock order is
+# registry -> stream; never take the registry lock while holding a stream lock.
+codex_streams_lock = InstrumentedLock()
+codex_stream_conditions = {}
+# Leaf lock over creating and discarding entries of `codex_stream_conditions`.
+# Streams leave `codex_streams` before their condition is discarded, so a
+# condition is only created for a stream still registered under this lock.
+_stream_conditions_lock = threading.Lock()
+_retired_stream_lock_stats = {'acquisitions': 0, 'contended': 0, 'wait_seconds': 0.0}
+
+
+def codex_stream_condition(stream_id):
+    """Return the condition guarding one stream, or None for an unknown stream.
+
+    Refusing ids that are not in `codex_streams` keeps a caller racing the
+    stream's removal from recreating a condition nothing would discard.
+    """
+    condition = codex_stream_conditions.get(stream_id)
+    if condition is not None:
+        return condition
+    with _stream_conditions_lock:
+        if stream_id not in codex_streams:
+            return None
+        return codex_stream_conditions.setdefault(stream_id, _StreamCondition())
+
+
+def discard_codex_stream_condition(stream_id):
+    with _stream_conditions_lock:
+        condition = codex_stream_conditions.pop(stream_id, None)
+    if condition is None:
+        return
+    lock_stats = condition.lock
+    _retired_stream_lock_stats['acquisitions'] += lock_stats.acquisitions
+    _retired_stream_lock_stats['contended'] += lock_stats.contended
+    _retired_stream_lock_stats['wait_seconds'] += lock_stats.wait_seconds
+
+
+def codex_stream_lock_stats():
+    acquisitions = _retired_stream_lock_stats['acquisitions']
+    contended = _retired_stream_lock_stats['contended']
+    wait_seconds = _retired_stream_lock_stats['wait_seconds']
+    for condition in list(codex_stream_conditions.values()):
+        lock_stats = condition.lock
+        acquisitions += lock_stats.acquisitions
+        contended += lock_stats.contended
+        wait_seconds += lock_stats.wait_seconds
+    return {
+        'registry': codex_streams_lock.stats(),
+        'streams': {
+            'acquisitions': acquisitions,
+            'contended': contended,
+            'wait_ms': round(wait_seconds * 1000, 3),
+            'active_locks': len(codex_stream_conditions),
+        },
+    }
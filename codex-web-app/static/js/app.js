@@ -1598,6 +1598,7 @@ function clearStreamState(streamId) {
         clearTimeout(stream.timer);
         stream.timer = null;
     }
+    closeStreamEventSource(stream);
     if (stream.entry?.wrapper) {
         setMessageStreaming(stream.entry.wrapper, false);
     }
@@ -27918,12 +27919,16 @@ function beginStreamPolling(streamId) {
     stream.failureCount = 0;
     stream.pollDelay = STREAM_POLL_BASE_MS;
     scheduleSessionsRender();
-    scheduleStreamPoll(streamId, 0);
+    void connectStreamEventSource(streamId).then(connected => {
+        if (!connected) {
+            scheduleStreamPoll(streamId, 0);
+        }
+    });
 }
 
 function scheduleStreamPoll(streamId, delay) {
     const stream = state.streams[streamId];
-    if (!stream) return;
+    if (!stream || stream.eventSource) return;
     if (stream.timer) {
         clearTimeout(stream.timer);
     }
@@ -27977,76 +27982,174 @@ async function stopStream(sessionId) {
     }
 }
 
-async function pollStream(streamId) {
+async function buildStreamEventsUrl(stream) {
+    const params = new URLSearchParams({
+        offset: String(stream.outputOffset || 0),
+        error_offset: String(stream.errorOffset || 0),
+        event_offset: String(stream.eventOffset || 0)
+    });
+    if (shouldEncryptChatPromptRequests()) {
+        // The trusted HTTP fallback is marked by a header, which EventSource cannot send.
+        if (!isFileBrowserCryptoSupported()) return '';
+        const session = await getChatPromptCryptoSession();
+        params.set('crypto_session', session.id);
+    }
+    return `/api/codex/streams/${encodeURIComponent(stream.id)}/events?${params.toString()}`;
+}
+
+function closeStreamEventSource(stream) {
+    if (!stream?.eventSource) return;
+    stream.eventSource.close();
+    stream.eventSource = null;
+}
+
+function fallBackToStreamPolling(streamId, source, delay = STREAM_POLL_BASE_MS) {
     const stream = state.streams[streamId];
-    if (!stream || stream.polling) return;
-    stream.polling = true;
+    if (!stream || stream.eventSource !== source) return;
+    closeStreamEventSource(stream);
+    // Polling resumes from the offsets the event stream already delivered.
+    stream.eventSourceFailed = true;
+    scheduleStreamPoll(streamId, delay);
+}
 
+async function connectStreamEventSource(streamId) {
+    const stream = state.streams[streamId];
+    if (!stream || stream.eventSourceFailed || typeof window.EventSource !== 'function') {
+        return false;
+    }
+    let streamUrl = '';
     try {
-        const result = await fetchChatResponseJson(`/api/codex/streams/${stream.id}?offset=${stream.outputOffset}&error_offset=${stream.errorOffset}&event_offset=${stream.eventOffset || 0}`);
-        const current = state.streams[streamId];
-        if (!current) {
-            return;
-        }
-
-        current.failureCount = 0;
-        current.pollDelay = STREAM_POLL_BASE_MS;
-        if (typeof result?.process_running === 'boolean') {
-            current.processRunning = result.process_running;
-        }
-        current.processPid = Number.isFinite(result?.process_pid) ? result.process_pid : null;
-        if (Number.isFinite(result?.runtime_ms)) {
-            current.runtimeMs = result.runtime_ms;
-        }
-        if (Number.isFinite(result?.idle_ms)) {
-            current.idleMs = result.idle_ms;
-        }
-        const resultMessageId = typeof result?.assistant_message_id === 'string'
-            ? result.assistant_message_id.trim()
-            : '';
-        if (resultMessageId && resultMessageId !== current.messageId) {
-            current.messageId = resultMessageId;
-            persistActiveStream(current);
-            if (current.entry?.wrapper) {
-                setMessageWrapperIdentity(
-                    current.entry.wrapper,
-                    resolveMessageRoleFromWrapper(current.entry.wrapper),
-                    current.entry.wrapper.dataset.messageTimestampValue,
-                    resultMessageId
-                );
+        streamUrl = await buildStreamEventsUrl(stream);
+    } catch (error) {
+        streamUrl = '';
+    }
+    if (!streamUrl || state.streams[streamId] !== stream) {
+        return false;
+    }
+    closeStreamEventSource(stream);
+    const source = new EventSource(streamUrl);
+    stream.eventSource = source;
+    // Deltas may need async decryption; apply them strictly in arrival order.
+    let pending = Promise.resolve();
+    const enqueue = task => {
+        pending = pending.then(task).catch(() => fallBackToStreamPolling(streamId, source));
+    };
+    source.addEventListener('delta', event => {
+        if (stream.eventSource !== source) return;
+        enqueue(async () => {
+            if (stream.eventSource !== source) return;
+            const result = await decryptChatPromptResponsePayload(JSON.parse(event.data));
+            if (stream.eventSource !== source) return;
+            if (result?.done) {
+                closeStreamEventSource(stream);
             }
-        }
+            await applyStreamResult(streamId, result);
+        });
+    });
+    source.addEventListener('end', event => {
+        if (stream.eventSource !== source) return;
+        enqueue(async () => {
+            if (stream.eventSource !== source) return;
+            closeStreamEventSource(stream);
+            let payload = null;
+            try {
+                payload = JSON.parse(event.data);
+            } catch (error) {
+                payload = null;
+            }
+            if (payload?.error_code === 'stream_not_found') {
+                await recoverMissingStream(stream);
+                return;
+            }
+            if (state.streams[streamId] === stream) {
+                stream.eventSourceFailed = true;
+                scheduleStreamPoll(streamId, 0);
+            }
+        });
+    });
+    source.onerror = () => {
+        // EventSource would reconnect with the original offsets and replay output, so poll instead.
+        fallBackToStreamPolling(streamId, source);
+    };
+    return true;
+}
 
-        if (result?.output) {
-            current.output += result.output;
-            current.outputOffset = Number.isFinite(result.output_length)
-                ? result.output_length
-                : current.output.length;
-        }
-        if (result?.error) {
-            current.error += result.error;
-            current.errorOffset = Number.isFinite(result.error_length)
-                ? result.error_length
-                : current.error.length;
-        }
-        if (Number.isFinite(result?.event_length)) {
-            current.eventOffset = result.event_length;
-        }
-        appendCodexEvents(current, result?.events);
+async function applyStreamResult(streamId, result) {
+    const current = state.streams[streamId];
+    if (!current) {
+        return false;
+    }
 
-        if (result?.output || result?.error) {
-            updateStreamEntry(current);
+    current.failureCount = 0;
+    current.pollDelay = STREAM_POLL_BASE_MS;
+    if (typeof result?.process_running === 'boolean') {
+        current.processRunning = result.process_running;
+    }
+    current.processPid = Number.isFinite(result?.process_pid) ? result.process_pid : null;
+    if (Number.isFinite(result?.runtime_ms)) {
+        current.runtimeMs = result.runtime_ms;
+    }
+    if (Number.isFinite(result?.idle_ms)) {
+        current.idleMs = result.idle_ms;
+    }
+    const resultMessageId = typeof result?.assistant_message_id === 'string'
+        ? result.assistant_message_id.trim()
+        : '';
+    if (resultMessageId && resultMessageId !== current.messageId) {
+        current.messageId = resultMessageId;
+        persistActiveStream(current);
+        if (current.entry?.wrapper) {
+            setMessageWrapperIdentity(
+                current.entry.wrapper,
+                resolveMessageRoleFromWrapper(current.entry.wrapper),
+                current.entry.wrapper.dataset.messageTimestampValue,
+                resultMessageId
+            );
         }
-        setSessionStatus(current.sessionId, buildActiveStreamStatus(current.processRunning));
+    }
 
-        if (result?.done) {
-            await finishStream(streamId, result);
-            return;
-        }
-        if (current.processRunning === false && Number.isFinite(current.idleMs) && current.idleMs >= STREAM_IDLE_WARNING_MS) {
-            setSessionStatus(current.sessionId, 'Receiving response... (CLI finalizing, no recent output)');
+    if (result?.output) {
+        current.output += result.output;
+        current.outputOffset = Number.isFinite(result.output_length)
+            ? result.output_length
+            : current.output.length;
+    }
+    if (result?.error) {
+        current.error += result.error;
+        current.errorOffset = Number.isFinite(result.error_length)
+            ? result.error_length
+            : current.error.length;
+    }
+    if (Number.isFinite(result?.event_length)) {
+        current.eventOffset = result.event_length;
+    }
+    appendCodexEvents(current, result?.events);
+
+    if (result?.output || result?.error) {
+        updateStreamEntry(current);
+    }
+    setSessionStatus(current.sessionId, buildActiveStreamStatus(current.processRunning));
+
+    if (result?.done) {
+        await finishStream(streamId, result);
+        return false;
+    }
+    if (current.processRunning === false && Number.isFinite(current.idleMs) && current.idleMs >= STREAM_IDLE_WARNING_MS) {
+        setSessionStatus(current.sessionId, 'Receiving response... (CLI finalizing, no recent output)');
+    }
+    return true;
+}
+
+async function pollStream(streamId) {
+    const stream = state.streams[streamId];
+    if (!stream || stream.polling) return;
+    stream.polling = true;
+
+    try {
+        const result = await fetchChatResponseJson(`/api/codex/streams/${stream.id}?offset=${stream.outputOffset}&error_offset=${stream.errorOffset}&event_offset=${stream.eventOffset || 0}`);
+        if (await applyStreamResult(streamId, result)) {
+            scheduleStreamPoll(streamId, STREAM_POLL_BASE_MS);
         }
-        scheduleStreamPoll(streamId, STREAM_POLL_BASE_MS);
     } catch (error) {
         const current = state.streams[streamId];
         if (!current) {
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Compare sequential and parallel zip creation for file-panel downloads."""
+
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from zipfile import ZipFile
+
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPT_DIR.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from codex_agent.services import file_browser  # noqa: E402
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description='Build the same folder archive with 1 worker and with N workers and report timings.',
+    )
+    parser.add_argument('--files', type=int, default=64, help='Number of generated files (default: 64).')
+    parser.add_argument('--file-kb', type=int, default=1024, help='Size of each generated file in KB (default: 1024).')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=max(2, min(8, os.cpu_count() or 2)),
+        help='Worker count for the parallel run (default: CPU count, 2..8).',
+    )
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per mode; the best time is reported (default: 3).')
+    parser.add_argument('--source', help='Archive this existing directory instead of generated files.')
+    return parser.parse_args()
+
+
+def _generate_files(directory, count, size_kb):
+    rng = random.Random(20260101)
+    words = [f'token{index}' for index in range(512)]
+    for index in range(count):
+        target = directory / f'file-{index:04d}.txt'
+        remaining = size_kb * 1024
+        with target.open('w', encoding='utf-8') as handle:
+            while remaining > 0:
+                line = ' '.join(rng.choice(words) for _ in range(12)) + '\n'
+                handle.write(line)
+                remaining -= len(line)
+
+
+def _archive_entries(source_dir):
+    file_browser._get_server_root = lambda: source_dir.parent
+    _, _, targets = file_browser._resolve_archive_targets('server', [source_dir.name])
+    entries, _, file_count, _, total_bytes = file_browser._collect_archive_entries(
+        source_dir.parent,
+        targets,
+        byte_limit=1 << 62,
+        byte_limit_message='',
+    )
+    return entries, file_count, total_bytes
+
+
+def _time_archive(entries, workers, repeat):
+    best = None
+    archive = b''
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        archive = b''.join(file_browser._iter_zip_stream(entries, workers=workers))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, archive
+
+
+def main():
+    args = _parse_args()
+    with tempfile.TemporaryDirectory(prefix='codex-zip-bench-') as temp_dir:
+        if args.source:
+            source_dir = Path(args.source).resolve()
+        else:
+            source_dir = Path(temp_dir) / 'bundle'
+            source_dir.mkdir()
+            _generate_files(source_dir, args.files, args.file_kb)
+
+        entries, file_count, total_bytes = _archive_entries(source_dir)
+        sequential_seconds, sequential = _time_archive(entries, 1, args.repeat)
+        parallel_seconds, parallel = _time_archive(entries, args.workers, args.repeat)
+
+        with ZipFile(io.BytesIO(sequential)) as left, ZipFile(io.BytesIO(parallel)) as right:
+            if right.testzip() is not None or left.namelist() != right.namelist():
+                print('parallel archive does not match the sequential archive', file=sys.stderr)
+                return 1
+            for name in left.namelist():
+                if left.read(name) != right.read(name):
+                    print(f'content mismatch: {name}', file=sys.stderr)
+                    return 1
+
+    megabytes = total_bytes / (1024 * 1024)
+    print(f'files={file_count} source={megabytes:.1f}MB cpu_count={os.cpu_count()}')
+    print(f'sequential  workers=1  {sequential_seconds:.3f}s  {megabytes / sequential_seconds:.1f}MB/s')
+    print(
+        f'parallel    workers={args.workers}  {parallel_seconds:.3f}s  '
+        f'{megabytes / parallel_seconds:.1f}MB/s  speedup={sequential_seconds / parallel_seconds:.2f}x'
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
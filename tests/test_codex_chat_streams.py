@@ -26,6 +26,11 @@ from codex_agent import config as codex_config
 from codex_agent import state
 from codex_agent.blueprints import codex_chat as codex_chat_blueprint
 from codex_agent.services import codex_chat
+from codex_agent.services.stream_buffer import (
+    StreamTextBuffer,
+    stream_text_has_visible_text,
+)
+from codex_agent.services.usage_series import KeyedSeries
 
 CHAT_CRYPTO_INFO = b'codex-workbench-chat-prompt-v1'
 
@@ -578,6 +583,338 @@ def test_session_store_save_uses_atomic_replacement(isolated_codex_workspace):
     assert not list(store_path.parent.glob(f'.{store_path.name}.*.tmp'))
 
 
+def test_session_store_writes_one_shard_per_session(isolated_codex_workspace):
+    store_path = isolated_codex_workspace['store_path']
+    first = codex_chat.create_session('first')
+    second = codex_chat.create_session('second')
+    shard_dir = store_path.with_name('codex_chat_sessions.d')
+    second_shard = shard_dir / f"{second['id']}.json"
+    second_shard_before = second_shard.read_text(encoding='utf-8')
+
+    codex_chat.append_message(first['id'], 'user', 'hello shard')
+
+    index = json.loads(store_path.read_text(encoding='utf-8'))
+    assert index['layout'] == 'sharded'
+    assert {entry['id'] for entry in index['sessions']} == {first['id'], second['id']}
+    assert all('messages' not in entry for entry in index['sessions'])
+    first_messages = codex_chat.get_session(first['id'])['messages']
+    assert [message['content'] for message in first_messages] == ['hello shard']
+    assert second_shard.read_text(encoding='utf-8') == second_shard_before
+
+    assert codex_chat.delete_session(second['id']) is True
+    assert not second_shard.exists()
+    assert [item['id'] for item in codex_chat.list_sessions()] == [first['id']]
+
+
+def test_message_writes_copy_only_the_changed_message(isolated_codex_workspace, monkeypatch):
+    session = codex_chat.create_session('copy on write')
+    first = codex_chat.append_message(session['id'], 'user', 'question')
+    reply = codex_chat.append_message(session['id'], 'assistant', '')
+    cached = codex_chat._load_data(session['id'], readonly=True)['sessions'][0]
+    cached_messages = list(cached['messages'])
+
+    def no_deep_merge(payloads):
+        raise AssertionError('message writes must not deep-copy the session store')
+
+    monkeypatch.setattr(codex_chat, '_merge_session_store_payloads', no_deep_merge)
+    codex_chat.update_message(session['id'], reply['id'], content='partial answer')
+    codex_chat.append_message(session['id'], 'user', 'follow-up')
+
+    # The cached record handed to readers is never mutated in place.
+    assert cached['messages'] == cached_messages
+    assert cached['messages'][1]['content'] == ''
+    updated = codex_chat._load_data(session['id'], readonly=True)['sessions'][0]
+    assert [message['content'] for message in updated['messages']] == [
+        'question', 'partial answer', 'follow-up',
+    ]
+    assert updated['messages'][0] is cached['messages'][0]
+    assert updated['messages'][0]['id'] == first['id']
+
+
+def test_session_store_never_overwrites_a_shard_that_failed_to_load(isolated_codex_workspace):
+    store_path = isolated_codex_workspace['store_path']
+    session = codex_chat.create_session('fragile')
+    codex_chat.append_message(session['id'], 'user', 'keep me')
+    codex_chat._compact_session_journal(session['id'])
+    shard_path = store_path.with_name('codex_chat_sessions.d') / f"{session['id']}.json"
+    shard_text = shard_path.read_text(encoding='utf-8')
+
+    # A shard that vanished (e.g. a sync tool briefly moved it) is read from
+    # the index alone, but neither a save nor a compaction recreates it.
+    shard_path.unlink()
+    assert codex_chat.get_session(session['id'])['messages'] == []
+    with pytest.raises(codex_chat.SessionStoreReadError):
+        codex_chat.append_message(session['id'], 'user', 'lost')
+    with pytest.raises(codex_chat.SessionStoreReadError):
+        codex_chat._compact_session_journal(session['id'])
+    assert not shard_path.exists()
+
+    shard_path.write_text('{"messages": [', encoding='utf-8')
+    with pytest.raises(codex_chat.SessionStoreReadError):
+        codex_chat.append_message(session['id'], 'user', 'lost')
+    assert shard_path.read_text(encoding='utf-8') == '{"messages": ['
+
+    shard_path.write_text(shard_text, encoding='utf-8')
+    codex_chat.append_message(session['id'], 'user', 'after restore')
+    contents = [message['content'] for message in codex_chat.get_session(session['id'])['messages']]
+    assert contents == ['keep me', 'after restore']
+
+
+def test_session_journal_records_content_deltas_and_compacts(isolated_codex_workspace):
+    store_path = isolated_codex_workspace['store_path']
+    session = codex_chat.create_session('journal')
+    message = codex_chat.append_message(session['id'], 'assistant', '')
+    shard_path = store_path.with_name('codex_chat_sessions.d') / f"{session['id']}.json"
+    shard_before = shard_path.read_text(encoding='utf-8')
+
+    text = ''
+    for index in range(20):
+        text += f'chunk-{index} '
+        codex_chat.update_message(session['id'], message['id'], content=text, metadata={'partial': True})
+    codex_chat.update_message(session['id'], message['id'], metadata={'partial': None})
+
+    journal_paths = list(shard_path.parent.glob('*.journal.jsonl'))
+    assert len(journal_paths) == 1
+    records = [json.loads(line) for line in journal_paths[0].read_text(encoding='utf-8').splitlines()]
+    assert records[0]['op'] == 'append_message'
+    assert records[-2]['content_append'] == 'chunk-19 '
+    assert shard_path.read_text(encoding='utf-8') == shard_before
+
+    loaded = codex_chat.get_session(session['id'])['messages'][0]
+    assert loaded['content'] == text
+    assert 'partial' not in loaded
+
+    codex_chat._compact_session_journal(session['id'])
+
+    assert not list(shard_path.parent.glob('*.journal.jsonl'))
+    assert json.loads(shard_path.read_text(encoding='utf-8'))['messages'][0]['content'] == text
+    assert codex_chat.get_session(session['id'])['messages'][0]['content'] == text
+
+
+def test_session_journal_ignores_torn_trailing_record(isolated_codex_workspace):
+    store_path = isolated_codex_workspace['store_path']
+    session = codex_chat.create_session('torn-journal')
+    message = codex_chat.append_message(session['id'], 'assistant', 'partial')
+    journal_path = next(store_path.with_name('codex_chat_sessions.d').glob('*.journal.jsonl'))
+    with journal_path.open('a', encoding='utf-8') as handle:
+        handle.write('{"op": "update_message", "id"')
+
+    codex_chat.update_message(session['id'], message['id'], content='partial answer')
+
+    assert codex_chat.get_session(session['id'])['messages'][0]['content'] == 'partial answer'
+
+
+def _forget_session_store_caches():
+    codex_chat._SESSION_STORE_FILE_CACHE.clear()
+    codex_chat._SESSION_SHARD_CACHE.clear()
+    codex_chat._SESSION_INDEX_OVERLAY.clear()
+    codex_chat._invalidate_session_store_merge_cache()
+
+
+def test_session_journal_stages_index_updates_until_flush(isolated_codex_workspace, monkeypatch):
+    store_path = isolated_codex_workspace['store_path']
+    monkeypatch.setattr(codex_chat, '_schedule_session_index_flush', lambda: None)
+    session = codex_chat.create_session('lazy index')
+    message = codex_chat.append_message(session['id'], 'assistant', '')
+    index_writes = []
+    original_write = codex_chat._write_session_store_index
+
+    def _counting_write(entries):
+        index_writes.append(len(entries))
+        return original_write(entries)
+
+    monkeypatch.setattr(codex_chat, '_write_session_store_index', _counting_write)
+
+    text = ''
+    for index in range(10):
+        text += f'chunk-{index} '
+        codex_chat.update_message(session['id'], message['id'], content=text)
+    codex_chat.append_message(session['id'], 'user', 'next question')
+
+    assert index_writes == []
+    listed = codex_chat.list_sessions()[0]
+    assert listed['message_count'] == 2
+    assert listed['updated_at'] == codex_chat.get_session(session['id'])['updated_at']
+
+    codex_chat._flush_session_index(store_path)
+    assert index_writes == [1]
+    entry = json.loads(store_path.read_text(encoding='utf-8'))['sessions'][0]
+    journal_path = next(store_path.with_name('codex_chat_sessions.d').glob('*.journal.jsonl'))
+    assert entry['journal_offset'] == journal_path.stat().st_size
+    assert entry['summary']['message_count'] == 2
+
+    # A restart before the next flush drops the staged entry; the recorded
+    # journal offset shows the summary is behind, so it is rebuilt.
+    codex_chat.append_message(session['id'], 'user', 'third')
+    _forget_session_store_caches()
+    assert codex_chat.list_sessions()[0]['message_count'] == 3
+
+
+def test_session_journal_survives_crash_between_shard_and_index_writes(isolated_codex_workspace, monkeypatch):
+    monkeypatch.setattr(codex_chat, '_schedule_session_index_flush', lambda: None)
+    session = codex_chat.create_session('crash')
+    message = codex_chat.append_message(session['id'], 'assistant', 'before')
+    original_write = codex_chat._write_session_store_index
+
+    def _crash(entries):
+        raise OSError('simulated crash')
+
+    # Compaction writes the new shard, then dies before the index names its journal.
+    monkeypatch.setattr(codex_chat, '_write_session_store_index', _crash)
+    with pytest.raises(OSError):
+        codex_chat._compact_session_journal(session['id'])
+    monkeypatch.setattr(codex_chat, '_write_session_store_index', original_write)
+    _forget_session_store_caches()
+
+    codex_chat.update_message(session['id'], message['id'], content='after crash')
+    codex_chat.append_message(session['id'], 'user', 'follow-up')
+    _forget_session_store_caches()
+
+    messages = codex_chat.get_session(session['id'])['messages']
+    assert [item['content'] for item in messages] == ['after crash', 'follow-up']
+    assert codex_chat.list_sessions()[0]['message_count'] == 2
+
+
+def test_message_token_estimates_are_stored_and_reused(isolated_codex_workspace, monkeypatch):
+    session = codex_chat.create_session('estimates')
+    message = codex_chat.append_message(session['id'], 'assistant', 'first words')
+    codex_chat.update_message(session['id'], message['id'], content='first words and more')
+
+    stored = codex_chat.get_session(session['id'])['messages'][0]
+    assert stored['token_estimate']['tokens'] == codex_chat._estimate_tokens_from_text('first words and more')
+
+    estimates = []
+    original_estimate = codex_chat._estimate_tokens_from_text
+
+    def _counting_estimate(text):
+        estimates.append(text)
+        return original_estimate(text)
+
+    monkeypatch.setattr(codex_chat, '_estimate_tokens_from_text', _counting_estimate)
+    monkeypatch.setattr(codex_chat, '_MESSAGE_TOKEN_ESTIMATE_CACHE', {})
+
+    assert codex_chat._estimate_message_tokens(stored) == stored['token_estimate']['tokens']
+    assert codex_chat._estimate_session_token_usage({'messages': [stored]})['estimated'] is True
+    assert estimates == []
+
+    legacy = {'id': 'legacy', 'role': 'user', 'content': 'legacy prompt text'}
+    for _ in range(3):
+        codex_chat._estimate_message_tokens(legacy)
+    assert estimates == ['legacy prompt text']
+
+    edited = dict(stored, content='rewritten outside the server')
+    assert codex_chat._estimate_message_tokens(edited) == original_estimate('rewritten outside the server')
+
+    # The stamp is trusted by length; the content itself is not re-read.
+    body = 'a' * 400
+    middle = codex_chat.append_message(session['id'], 'assistant', body)
+    estimates.clear()
+    assert codex_chat._estimate_message_tokens(dict(middle, content='b' * 400)) == original_estimate(body)
+    assert estimates == []
+
+    # Stamps written with the older `<length>:<hash>` key are still honoured.
+    older = dict(middle, token_estimate={'tokens': 7, 'content_key': '400:0123abcd'})
+    assert codex_chat._estimate_message_tokens(older) == 7
+
+
+def test_session_store_cache_skips_reparsing_unchanged_files(isolated_codex_workspace, monkeypatch):
+    session = codex_chat.create_session('cached')
+    message = codex_chat.append_message(session['id'], 'assistant', 'partial')
+    codex_chat.get_session(session['id'])
+    reads = []
+    original_read = codex_chat._read_json_object_from_path
+
+    def _counting_read(path):
+        reads.append(Path(path).name)
+        return original_read(path)
+
+    monkeypatch.setattr(codex_chat, '_read_json_object_from_path', _counting_read)
+
+    codex_chat.list_sessions()
+    codex_chat.get_session(session['id'])
+    assert reads == []
+
+    codex_chat.update_message(session['id'], message['id'], content='partial answer')
+    assert codex_chat.get_session(session['id'])['messages'][0]['content'] == 'partial answer'
+    assert reads == []
+
+
+def test_session_store_cache_detects_writes_from_other_processes(isolated_codex_workspace):
+    store_path = isolated_codex_workspace['store_path']
+    session = codex_chat.create_session('before')
+    assert codex_chat.list_sessions()[0]['title'] == 'before'
+
+    index = json.loads(store_path.read_text(encoding='utf-8'))
+    index['sessions'][0]['title'] = 'external rename'
+    shard_path = store_path.with_name('codex_chat_sessions.d') / f"{session['id']}.json"
+    shard = json.loads(shard_path.read_text(encoding='utf-8'))
+    shard['title'] = 'external rename'
+    for path, payload in ((store_path, index), (shard_path, shard)):
+        temp_path = path.with_name(f'{path.name}.external')
+        temp_path.write_text(json.dumps(payload), encoding='utf-8')
+        os.replace(temp_path, path)
+
+    assert codex_chat.list_sessions()[0]['title'] == 'external rename'
+    assert codex_chat.get_session(session['id'])['title'] == 'external rename'
+
+
+def test_list_sessions_answers_from_summary_index_without_transcripts(isolated_codex_workspace, monkeypatch):
+    session = codex_chat.create_session('summary-index')
+    codex_chat.append_message(session['id'], 'user', 'hello there')
+    assistant = codex_chat.append_message(session['id'], 'assistant', '', metadata={'response_mode': 'plan'})
+    codex_chat.update_message(session['id'], assistant['id'], content='partial')
+    codex_chat.update_message(
+        session['id'],
+        assistant['id'],
+        content='final answer',
+        metadata={'token_usage': {'input_tokens': 40, 'cached_input_tokens': 10, 'output_tokens': 12}},
+    )
+    expected_usage = codex_chat._estimate_session_token_usage(codex_chat.get_session(session['id']))
+
+    def _fail_read_shard(*_args, **_kwargs):
+        raise AssertionError('list_sessions must not load transcripts')
+
+    monkeypatch.setattr(codex_chat, '_read_session_shard', _fail_read_shard)
+    items = codex_chat.list_sessions()
+
+    assert len(items) == 1
+    assert items[0]['message_count'] == 2
+    assert items[0]['last_response_mode'] == 'plan'
+    assert items[0]['token_count'] == expected_usage['total_tokens']
+    assert items[0]['input_token_count'] == expected_usage['input_tokens']
+    assert items[0]['output_token_count'] == expected_usage['output_tokens']
+    assert items[0]['token_estimated'] is True
+
+
+def test_session_store_migrates_monolithic_file_on_first_write(isolated_codex_workspace):
+    store_path = isolated_codex_workspace['store_path']
+    store_path.write_text(json.dumps({'sessions': [
+        {
+            'id': 'legacy-a',
+            'title': 'legacy a',
+            'created_at': '2026-04-16T10:00:00+09:00',
+            'updated_at': '2026-04-16T10:00:00+09:00',
+            'messages': [{'id': 'm-1', 'role': 'user', 'content': 'kept', 'created_at': '2026-04-16T10:00:00+09:00'}],
+        },
+        {
+            'id': 'legacy-b',
+            'title': 'legacy b',
+            'created_at': '2026-04-16T09:00:00+09:00',
+            'updated_at': '2026-04-16T09:00:00+09:00',
+            'messages': [],
+        },
+    ]}), encoding='utf-8')
+
+    assert codex_chat.get_session('legacy-a')['messages'][0]['content'] == 'kept'
+    codex_chat.append_message('legacy-b', 'user', 'after migration')
+
+    index = json.loads(store_path.read_text(encoding='utf-8'))
+    assert index['layout'] == 'sharded'
+    assert all('messages' not in entry for entry in index['sessions'])
+    assert codex_chat.get_session('legacy-a')['messages'][0]['content'] == 'kept'
+    assert codex_chat.get_session('legacy-b')['messages'][0]['content'] == 'after migration'
+
+
 def test_session_list_route_returns_unavailable_when_store_is_invalid(
         isolated_codex_workspace, chat_route_client, monkeypatch):
     isolated_codex_workspace['store_path'].write_text('{"sessions": [', encoding='utf-8')
@@ -589,6 +926,432 @@ def test_session_list_route_returns_unavailable_when_store_is_invalid(
     assert response.get_json()['code'] == 'session_store_unavailable'
 
 
+def test_session_messages_route_pages_backwards_by_cursor(
+        isolated_codex_workspace, chat_route_client, monkeypatch):
+    monkeypatch.setattr(codex_chat_blueprint, 'CODEX_REQUIRE_ENCRYPTED_CHAT_PROMPTS', False)
+    session = codex_chat.create_session('paged')
+    message_ids = [
+        codex_chat.append_message(session['id'], 'user', f'message {index}')['id']
+        for index in range(5)
+    ]
+
+    first = chat_route_client.get(f"/api/codex/sessions/{session['id']}/messages?limit=2").get_json()
+    assert [item['id'] for item in first['messages']] == message_ids[3:]
+    assert first['has_more'] is True
+    assert first['session']['message_count'] == 5
+    assert 'messages' not in first['session']
+
+    second = chat_route_client.get(
+        f"/api/codex/sessions/{session['id']}/messages?limit=2&before={first['next_before']}"
+    ).get_json()
+    assert [item['id'] for item in second['messages']] == message_ids[1:3]
+
+    last = chat_route_client.get(
+        f"/api/codex/sessions/{session['id']}/messages?limit=2&before={second['next_before']}"
+    ).get_json()
+    assert [item['id'] for item in last['messages']] == message_ids[:1]
+    assert last['has_more'] is False
+    assert last['next_before'] is None
+
+    detail = chat_route_client.get(f"/api/codex/sessions/{session['id']}/messages/{message_ids[2]}")
+    assert detail.get_json()['message']['content'] == 'message 2'
+    missing = chat_route_client.get(f"/api/codex/sessions/{session['id']}/messages?before=unknown")
+    assert missing.status_code == 404
+
+
+def test_codex_stream_events_push_deltas_heartbeats_and_end(isolated_codex_workspace):
+    session = codex_chat.create_session('sse-stream')
+    stream_id = 'sse-stream'
+    with state.codex_streams_lock:
+        state.codex_streams[stream_id] = _build_stream_state(
+            stream_id,
+            session['id'],
+            started_at=time.time(),
+            output_path=isolated_codex_workspace['workspace_dir'] / 'sse-stream.txt',
+        )
+
+    events = codex_chat.iter_codex_stream_events(stream_id, heartbeat_seconds=0.5)
+    initial = next(events)
+    assert initial['event'] == 'delta'
+    assert initial['data']['output'] == ''
+
+    assert next(events)['event'] == 'ping'
+
+    threading.Timer(
+        0.05,
+        codex_chat._append_stream_chunk,
+        args=(stream_id, 'output', 'hello'),
+    ).start()
+    delta = next(events)
+    assert delta['event'] == 'delta'
+    assert delta['data']['output'] == 'hello'
+    assert delta['data']['output_length'] == 5
+
+    codex_chat._append_stream_chunk(stream_id, 'output', ', world')
+    with codex_chat._locked_codex_stream(stream_id) as stream:
+        stream['done'] = True
+        stream['exit_code'] = 0
+        codex_chat._notify_codex_stream_locked(stream)
+    final = next(events)
+    assert final['data']['output'] == ', world'
+    assert final['data']['saved'] is True
+    assert final['data']['saved_message']['content'] == 'hello, world'
+    end = next(events)
+    assert end['event'] == 'end'
+    assert end['data']['exit_code'] == 0
+    assert list(events) == []
+    assert codex_chat.iter_codex_stream_events('missing-stream') is None
+
+
+def test_stream_text_buffer_spills_and_slices_by_offset():
+    buffer = StreamTextBuffer(spill_threshold=64 * 1024)
+    pieces = [f'줄 {index} 출력\n' for index in range(12000)]
+    for piece in pieces:
+        buffer.append(piece)
+    expected = ''.join(pieces)
+
+    assert buffer.spilled is True
+    assert len(buffer) == len(expected)
+    assert buffer.getvalue() == expected
+    for start in (0, 1, 4095, 70000, len(expected) - 3, len(expected)):
+        assert buffer.slice(start) == expected[start:]
+    assert buffer.slice(65530, 65560) == expected[65530:65560]
+    assert '줄 11999 출력' in buffer
+    buffer.close()
+
+    stream = {'output': 'seed'}
+    assert codex_chat._append_stream_text_locked(stream, 'output', '-next') == 9
+    assert isinstance(stream['output'], StreamTextBuffer)
+    assert codex_chat._stream_text(stream, 'output') == 'seed-next'
+
+
+def test_stream_text_buffer_tracks_visible_text():
+    buffer = StreamTextBuffer()
+    buffer.append('  \n\t')
+    assert buffer.has_visible_text is False
+    buffer.append('error: boom\n')
+    assert buffer.has_visible_text is True
+    buffer.close()
+
+    assert stream_text_has_visible_text('  \n') is False
+    assert stream_text_has_visible_text(' ok ') is True
+
+
+def test_stream_exec_errors_are_reported_once_per_stream(isolated_codex_workspace):
+    session = codex_chat.create_session('stream-error-dedupe')
+    stream_id = 'stream-error-dedupe'
+    with state.codex_streams_lock:
+        state.codex_streams[stream_id] = _build_stream_state(
+            stream_id,
+            session['id'],
+            started_at=time.time(),
+            output_path=isolated_codex_workspace['workspace_dir'] / 'stream-error-dedupe.txt',
+        )
+    try:
+        assert codex_chat._append_stream_exec_error(stream_id, 'error: boom') is True
+        for index in range(40):
+            codex_chat._append_stream_exec_error(stream_id, f'error: other {index}')
+        assert codex_chat._append_stream_exec_error(stream_id, 'error: boom') is False
+        # Exact lines: a longer error that merely contains a seen one is new.
+        assert codex_chat._append_stream_exec_error(stream_id, 'error: boom again') is True
+        with state.codex_streams_lock:
+            error_text = codex_chat._stream_text(state.codex_streams[stream_id], 'error')
+        assert error_text.splitlines().count('error: boom') == 1
+    finally:
+        with state.codex_streams_lock:
+            state.codex_streams.pop(stream_id, None)
+
+
+def test_stream_locks_are_per_stream_and_report_contention(isolated_codex_workspace):
+    session = codex_chat.create_session('stream-locks')
+    with state.codex_streams_lock:
+        for stream_id in ('lock-a', 'lock-b'):
+            state.codex_streams[stream_id] = _build_stream_state(
+                stream_id,
+                session['id'],
+                started_at=time.time(),
+                output_path=isolated_codex_workspace['workspace_dir'] / f'{stream_id}.txt',
+            )
+    contended_before = codex_chat.get_codex_stream_lock_stats()['streams']['contended']
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_stream_a():
+        with codex_chat._locked_codex_stream('lock-a'):
+            held.set()
+            release.wait(2)
+
+    holder = threading.Thread(target=hold_stream_a)
+    holder.start()
+    assert held.wait(2)
+    codex_chat._append_stream_chunk('lock-b', 'output', 'independent')
+    assert codex_chat.read_codex_stream('lock-b')['output'] == 'independent'
+
+    writer = threading.Thread(target=codex_chat._append_stream_chunk, args=('lock-a', 'output', 'late'))
+    writer.start()
+    time.sleep(0.05)
+    assert writer.is_alive()
+    release.set()
+    holder.join(2)
+    writer.join(2)
+
+    assert codex_chat.read_codex_stream('lock-a')['output'] == 'late'
+    stats = codex_chat.get_codex_stream_lock_stats()
+    assert stats['streams']['contended'] > contended_before
+    assert stats['streams']['wait_ms'] > 0
+
+
+def test_stream_conditions_are_not_recreated_for_removed_streams(isolated_codex_workspace):
+    session = codex_chat.create_session('stream-condition-leak')
+    stream_id = 'condition-leak'
+    with state.codex_streams_lock:
+        state.codex_streams[stream_id] = _build_stream_state(
+            stream_id,
+            session['id'],
+            started_at=time.time(),
+            output_path=isolated_codex_workspace['workspace_dir'] / 'condition-leak.txt',
+        )
+    codex_chat._append_stream_chunk(stream_id, 'output', 'hello')
+    assert stream_id in state.codex_stream_conditions
+
+    with state.codex_streams_lock:
+        state.codex_streams.pop(stream_id)
+        state.discard_codex_stream_condition(stream_id)
+
+    # A writer that looked the stream up before it was removed finds nothing.
+    assert state.codex_stream_condition(stream_id) is None
+    with codex_chat._locked_codex_stream(stream_id) as stream:
+        assert stream is None
+    codex_chat._append_stream_chunk(stream_id, 'output', 'late')
+    assert stream_id not in state.codex_stream_conditions
+
+
+def test_stream_json_events_are_classified_once_and_applied_under_one_lock(isolated_codex_workspace):
+    session = codex_chat.create_session('classified-events')
+    stream_id = 'classified-stream'
+    with state.codex_streams_lock:
+        state.codex_streams[stream_id] = _build_stream_state(
+            stream_id,
+            session['id'],
+            started_at=time.time(),
+            output_path=isolated_codex_workspace['workspace_dir'] / 'classified.txt',
+        )
+    stream_lock = state.codex_stream_condition(stream_id).lock
+
+    work_item = json.dumps({
+        'type': 'item.completed',
+        'item': {'type': 'command_execution', 'command': 'ls', 'status': 'completed'},
+    })
+    token_count = json.dumps({
+        'type': 'event_msg',
+        'payload': {
+            'type': 'token_count',
+            'info': {'last_token_usage': {'input_tokens': 12, 'output_tokens': 3, 'total_tokens': 15}},
+        },
+    })
+    final_message = json.dumps({
+        'type': 'item.completed',
+        'item': {'type': 'agent_message', 'text': '작업을 마쳤습니다.'},
+    })
+
+    acquisitions_before = stream_lock.acquisitions
+    codex_chat._handle_stream_json_output_line(stream_id, work_item)
+    codex_chat._handle_stream_json_output_line(stream_id, token_count)
+    assert stream_lock.acquisitions - acquisitions_before == 2
+
+    codex_chat._handle_stream_json_output_line(stream_id, final_message)
+    classified = codex_chat._classify_exec_event(json.loads(final_message))
+    assert classified.output_text == '작업을 마쳤습니다.'
+    assert classified.work_item is False
+
+    stream = codex_chat.get_codex_stream(stream_id)
+    assert stream['codex_event_count'] == 3
+    assert stream['work_item_seen'] is True
+    assert stream['work_item_completed_seen'] is True
+    assert stream['final_agent_message_after_work_seen'] is True
+    assert stream['token_usage']['total_tokens'] == 15
+    assert stream['output'] == '작업을 마쳤습니다.\n'
+    assert stream['output_last_message'] == '작업을 마쳤습니다.'
+
+
+def test_classify_exec_event_reads_each_type_field_once():
+    class CountingDict(dict):
+        def __init__(self, *args, reads, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.reads = reads
+
+        def get(self, key, default=None):
+            self.reads.append(key)
+            return super().get(key, default)
+
+    def counted(value, reads):
+        if isinstance(value, dict):
+            return CountingDict({key: counted(item, reads) for key, item in value.items()}, reads=reads)
+        return value
+
+    events = [
+        {'type': 'item.completed', 'item': {'type': 'command_execution', 'command': 'ls', 'status': 'failed'}},
+        {'type': 'item.started', 'item': {'type': 'mcp-tool-call', 'status': 'in_progress'}},
+        {'type': 'event_msg', 'payload': {'type': 'token_count', 'info': {
+            'last_token_usage': {'input_tokens': 12, 'output_tokens': 3, 'total_tokens': 15},
+        }}},
+        {'type': 'turn.failed', 'error': {'code': 'rate_limited', 'message': 'slow down'}},
+        {'type': 'session_meta', 'payload': {'id': '0199a213-81c0-7800-8aa1-bbab2a035a53'}},
+        {'type': 'event_msg', 'payload': {'type': 'task_complete', 'last_agent_message': ' done '}},
+        {'type': 'response_item', 'payload': {'type': 'image_generation_end', 'call_id': 'ig-1'}},
+        {'type': 'item.completed', 'item': {'type': 'agent_message', 'phase': 'final_answer', 'text': ''}},
+        {'type': 'turn.completed', 'usage': {'input_tokens': 4, 'output_tokens': 1}},
+    ]
+    for event in events:
+        classified = codex_chat._classify_exec_event(event)
+        assert classified.summary == codex_chat._summarize_exec_event(event)
+        assert classified.codex_session_id == codex_chat._extract_codex_session_id_from_exec_event(event)
+        assert classified.imagegen_activity == codex_chat._event_has_imagegen_workbench_activity(event)
+        assert classified.usage == codex_chat._extract_usage_from_exec_event(event)
+        assert classified.turn_completed == codex_chat._event_is_turn_completed(event)
+        assert classified.work_item == codex_chat._exec_event_is_work_item(event)
+        assert classified.task_complete == codex_chat._event_is_task_complete(event)
+        assert classified.empty_final_answer == codex_chat._event_is_empty_final_answer(event)
+        assert classified.agent_text == codex_chat._extract_agent_text_from_exec_event(event)
+
+        reads = []
+        codex_chat._classify_exec_event(counted(event, reads))
+        containers = 1 + sum(isinstance(event.get(key), dict) for key in ('payload', 'item'))
+        assert reads.count('type') == containers, event
+
+    assert codex_chat._classify_exec_event(events[0]).work_item_completed is True
+    assert codex_chat._classify_exec_event(events[0]).error_text == ''
+    assert codex_chat._classify_exec_event(events[1]).work_item is True
+    assert codex_chat._classify_exec_event(events[2]).usage['total_tokens'] == 15
+    assert codex_chat._classify_exec_event(events[3]).error_text == 'rate_limited: slow down'
+    assert codex_chat._classify_exec_event(events[5]).agent_text == 'done'
+    assert codex_chat._classify_exec_event(events[6]).imagegen_activity is True
+    assert codex_chat._classify_exec_event(events[7]).empty_final_answer is True
+
+
+def test_stream_progress_is_written_off_the_reader_thread_and_finalize_wins(
+        isolated_codex_workspace, monkeypatch):
+    session = codex_chat.create_session('progress-writer')
+    placeholder = codex_chat.append_message(session['id'], 'assistant', '')
+    stream_id = 'progress-writer-stream'
+    with state.codex_streams_lock:
+        stream = _build_stream_state(
+            stream_id,
+            session['id'],
+            started_at=time.time(),
+            output_path=isolated_codex_workspace['workspace_dir'] / 'progress-writer.txt',
+        )
+        stream['assistant_message_id'] = placeholder['id']
+        state.codex_streams[stream_id] = stream
+
+    writer_threads = []
+    original_update_message = codex_chat.update_message
+
+    def recording_update_message(*args, **kwargs):
+        writer_threads.append(threading.current_thread().name)
+        return original_update_message(*args, **kwargs)
+
+    monkeypatch.setattr(codex_chat, 'update_message', recording_update_message)
+    for chunk in ('first,', 'second,', 'third'):
+        codex_chat._append_stream_chunk(stream_id, 'output', chunk)
+    assert threading.current_thread().name not in writer_threads
+
+    deadline = time.time() + 3
+    while time.time() < deadline:
+        message = codex_chat.get_session_message(session['id'], placeholder['id'])
+        if message and message['content'] == 'first,second,third':
+            break
+        time.sleep(0.02)
+    assert message['content'] == 'first,second,third'
+    assert set(writer_threads) == {'codex-stream-progress-writer'}
+
+    with codex_chat._locked_codex_stream(stream_id) as stream:
+        stream['done'] = True
+        stream['exit_code'] = 0
+    codex_chat._append_stream_chunk(stream_id, 'output', '.tail')
+    saved = codex_chat.finalize_codex_stream(stream_id, trigger_queue=False)
+    codex_chat._persist_stream_progress(stream_id)
+    time.sleep(0.2)
+
+    final_message = codex_chat.get_session_message(session['id'], placeholder['id'])
+    assert final_message['content'] == saved['content']
+    assert 'first,second,third.tail' in final_message['content']
+    assert final_message.get('streaming') is not True
+
+
+def test_stream_progress_saves_only_the_new_tail(isolated_codex_workspace, monkeypatch):
+    session = codex_chat.create_session('progress-delta')
+    placeholder = codex_chat.append_message(session['id'], 'assistant', '')
+    stream_id = 'progress-delta-stream'
+    with state.codex_streams_lock:
+        stream = _build_stream_state(
+            stream_id,
+            session['id'],
+            started_at=time.time(),
+            output_path=isolated_codex_workspace['workspace_dir'] / 'progress-delta.txt',
+        )
+        stream['assistant_message_id'] = placeholder['id']
+        state.codex_streams[stream_id] = stream
+
+    calls = []
+    original_update_message = codex_chat.update_message
+
+    def recording_update_message(*args, **kwargs):
+        calls.append(kwargs)
+        return original_update_message(*args, **kwargs)
+
+    monkeypatch.setattr(codex_chat, 'update_message', recording_update_message)
+
+    def append_and_save(key, text):
+        with codex_chat._locked_codex_stream(stream_id) as stream:
+            codex_chat._append_stream_text_locked(stream, key, text)
+        codex_chat._write_stream_progress_locked(stream_id)
+        return codex_chat.get_session_message(session['id'], placeholder['id'])['content']
+
+    assert append_and_save('output', 'first') == 'first'
+    assert calls[-1]['content'] == 'first'
+    assert append_and_save('output', ',second') == 'first,second'
+    assert calls[-1]['content'] is None
+    assert (calls[-1]['content_offset'], calls[-1]['content_append']) == (5, ',second')
+    assert append_and_save('error', 'warn') == 'first,second\nwarn'
+    assert calls[-1]['content_append'] == '\nwarn'
+
+    # Someone else rewrote the message, so the delta no longer lines up.
+    codex_chat.update_message(session['id'], placeholder['id'], content='edited')
+    calls.clear()
+    assert append_and_save('error', '!') == 'first,second\nwarn!'
+    assert [call['content'] for call in calls] == [None, 'first,second\nwarn!']
+
+
+def test_codex_stream_events_route_streams_sse(isolated_codex_workspace, chat_route_client, monkeypatch):
+    monkeypatch.setattr(codex_chat_blueprint, 'CODEX_REQUIRE_ENCRYPTED_CHAT_PROMPTS', False)
+    session = codex_chat.create_session('sse-route')
+    stream_id = 'sse-route-stream'
+    with state.codex_streams_lock:
+        stream = _build_stream_state(
+            stream_id,
+            session['id'],
+            started_at=time.time(),
+            output_path=isolated_codex_workspace['workspace_dir'] / 'sse-route.txt',
+        )
+        stream['output'] = 'done output'
+        stream['output_length'] = len(stream['output'])
+        stream['done'] = True
+        stream['exit_code'] = 0
+        state.codex_streams[stream_id] = stream
+
+    response = chat_route_client.get(f'/api/codex/streams/{stream_id}/events?offset=5')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    body = response.get_data(as_text=True)
+    assert 'event: delta' in body
+    assert '"output": "output"' in body
+    assert 'event: end' in body
+
+    missing = chat_route_client.get('/api/codex/streams/unknown/events')
+    assert missing.status_code == 404
+
+
 def test_candidate_paths_skip_legacy_when_primary_exists(monkeypatch, tmp_path):
     primary = tmp_path / 'primary' / 'codex_chat_sessions.json'
     primary.parent.mkdir(parents=True, exist_ok=True)
@@ -667,6 +1430,52 @@ def test_token_usage_ledger_tracks_input_output_and_deduplicates(isolated_codex_
     assert isolated_codex_workspace['token_usage_path'].exists()
 
 
+def test_token_usage_ledger_appends_deltas_and_compacts_periodically(tmp_path, monkeypatch):
+    monkeypatch.setattr(codex_chat, '_TOKEN_LEDGER_COMPACT_DELTAS', 3)
+    ledger_path = tmp_path / 'codex_token_usage.json'
+    delta_path = tmp_path / 'codex_token_usage.json.deltas.jsonl'
+
+    def record(event_key, tokens=10):
+        return codex_chat._record_token_usage_to_path(
+            ledger_path, event_key, 'session-a',
+            {'input_tokens': tokens, 'output_tokens': 1},
+            now_iso='2026-07-21T10:00:00+09:00', day_key='2026-07-21',
+        )
+
+    # The first record bootstraps the snapshot; later ones only append.
+    assert record('e1') is True
+    assert ledger_path.exists() and not delta_path.exists()
+    snapshot_before = ledger_path.read_text(encoding='utf-8')
+    assert record('e2') is True
+    assert record('e2') is False
+    assert ledger_path.read_text(encoding='utf-8') == snapshot_before
+    assert len(delta_path.read_text(encoding='utf-8').splitlines()) == 1
+
+    summary = codex_chat.get_token_usage_summary(ledger_path=ledger_path)
+    assert summary['all_time']['requests'] == 2
+    assert summary['all_time']['input_tokens'] == 20
+
+    # Another process (no shared cache) still sees the logged keys.
+    codex_chat._TOKEN_LEDGER_DEDUPE_CACHE.clear()
+    assert record('e2') is False
+    assert record('e3') is True
+    assert record('e4') is True
+    assert not delta_path.exists()
+    compacted = json.loads(ledger_path.read_text(encoding='utf-8'))
+    assert compacted['all_time']['requests'] == 4
+    assert set(compacted['events']) == {'e1', 'e2', 'e3', 'e4'}
+
+    # A crash between writing the snapshot and removing the log must not
+    # double count on replay.
+    delta_path.write_text(json.dumps({
+        'event': 'e4', 'session': 'session-a', 'day': '2026-07-21',
+        'at': '2026-07-21T10:00:00+09:00', 'usage': {'input_tokens': 10, 'output_tokens': 1},
+    }) + '\n', encoding='utf-8')
+    summary = codex_chat.get_token_usage_summary(ledger_path=ledger_path)
+    assert summary['all_time']['requests'] == 4
+    assert summary['all_time']['input_tokens'] == 40
+
+
 def test_usage_event_v2_records_operation_model_credit_and_deduplicates(
         isolated_codex_workspace):
     saved = codex_chat.record_usage_event(
@@ -702,6 +1511,152 @@ def test_usage_event_v2_records_operation_model_credit_and_deduplicates(
     assert event['credit_equivalent']['value'] == pytest.approx(0.025415)
 
 
+def test_usage_event_id_index_survives_external_appends_and_rewrites(tmp_path):
+    path = tmp_path / 'codex_usage_events.jsonl'
+    index_path = tmp_path / 'codex_usage_events.jsonl.ids'
+    assert codex_chat._append_usage_event(path, {'event_id': 'first'}) is True
+    assert codex_chat._append_usage_event(path, {'event_id': 'second'}) is True
+    assert codex_chat._append_usage_event(path, {'event_id': 'first'}) is False
+    assert len(index_path.read_text(encoding='utf-8').splitlines()) == 3
+
+    # Another writer appended without touching the index.
+    with path.open('a', encoding='utf-8') as handle:
+        handle.write(json.dumps({'event_id': 'external'}) + '\n')
+    assert codex_chat._append_usage_event(path, {'event_id': 'external'}) is False
+
+    # A lost index is rebuilt from the log.
+    codex_chat._USAGE_EVENT_ID_INDEX_CACHE.clear()
+    index_path.unlink()
+    assert codex_chat._append_usage_event(path, {'event_id': 'second'}) is False
+    assert index_path.exists()
+
+    # Replacing the log (new inode) invalidates both the cache and the index.
+    replacement = tmp_path / 'replacement.jsonl'
+    replacement.write_text(json.dumps({'event_id': 'kept'}) + '\n', encoding='utf-8')
+    replacement.replace(path)
+    assert codex_chat._append_usage_event(path, {'event_id': 'first'}) is True
+    assert codex_chat._append_usage_event(path, {'event_id': 'kept'}) is False
+    ids = [json.loads(line)['event_id'] for line in path.read_text(encoding='utf-8').splitlines()]
+    assert ids == ['kept', 'first']
+
+
+def test_usage_event_legacy_migration_is_recorded_in_the_id_index(
+        isolated_codex_workspace, monkeypatch):
+    ledger_loads = []
+    original_load_ledger = codex_chat._load_token_usage_ledger
+
+    def counting_load_ledger(*args, **kwargs):
+        ledger_loads.append(kwargs.get('path'))
+        return original_load_ledger(*args, **kwargs)
+
+    monkeypatch.setattr(codex_chat, '_load_token_usage_ledger', counting_load_ledger)
+    codex_chat.get_usage_event_summary()
+    migrated_loads = len(ledger_loads)
+    assert migrated_loads >= 1
+
+    # Nothing was migrated (the ledger is empty), yet the flag still sticks,
+    # in memory and across a fresh process reading the sidecar.
+    codex_chat.get_usage_event_summary()
+    codex_chat._USAGE_EVENT_ID_INDEX_CACHE.clear()
+    codex_chat.get_usage_event_summary()
+    assert len(ledger_loads) == migrated_loads
+
+    context = codex_chat._account_storage_context()
+    events_path = Path(context['account_token_usage_path']).with_name('codex_usage_events.jsonl')
+    index_path = events_path.with_name('codex_usage_events.jsonl.ids')
+    header = json.loads(index_path.read_text(encoding='utf-8').splitlines()[0])
+    assert header['legacy_migrated'] is True
+
+
+def test_usage_event_rollup_parses_only_appended_lines_and_rebuilds_on_rewrite(tmp_path, monkeypatch):
+    path = tmp_path / 'codex_usage_events.jsonl'
+    rollup_path = tmp_path / 'codex_usage_events.jsonl.rollup.json'
+
+    def event(event_id, operation, tokens):
+        return {
+            'event_id': event_id,
+            'operation': operation,
+            'recorded_at': '2026-05-01T10:00:00+09:00',
+            'total_tokens': tokens,
+        }
+
+    codex_chat._append_usage_event(path, event('a', 'chat', 10))
+    codex_chat._append_usage_event(path, event('b', 'chat', 20))
+    rollup = codex_chat._load_usage_event_rollup_locked(path)
+    assert rollup['event_count'] == 2
+    assert rollup['by_operation']['chat']['total_tokens'] == 30
+    assert rollup['by_day']['2026-05-01']['requests'] == 2
+    assert json.loads(rollup_path.read_text(encoding='utf-8'))['offset'] == path.stat().st_size
+
+    # A fresh process resumes from the checkpoint and only parses the new line.
+    codex_chat._USAGE_EVENT_ROLLUP_CACHE.clear()
+    codex_chat._append_usage_event(path, event('c', 'git_commit_message', 5))
+    parsed = []
+    original_loads = codex_chat.json.loads
+
+    def counting_loads(value, *args, **kwargs):
+        if isinstance(value, bytes):
+            parsed.append(value)
+        return original_loads(value, *args, **kwargs)
+
+    monkeypatch.setattr(codex_chat.json, 'loads', counting_loads)
+    rollup = codex_chat._load_usage_event_rollup_locked(path)
+    monkeypatch.undo()
+    assert len(parsed) == 1
+    assert rollup['event_count'] == 3
+    assert rollup['by_operation']['git_commit_message']['total_tokens'] == 5
+    assert [item['event_id'] for item in rollup['recent']] == ['a', 'b', 'c']
+
+    # Rewriting the log in place keeps the inode but changes the bytes.
+    checkpoint_offset = rollup['offset']
+    path.write_text(
+        ''.join(json.dumps(event(f'rewritten-{index}', 'chat', 1)) + '\n' for index in range(4)),
+        encoding='utf-8',
+    )
+    assert path.stat().st_size > checkpoint_offset
+    rollup = codex_chat._load_usage_event_rollup_locked(path)
+    assert rollup['event_count'] == 4
+    assert rollup['by_operation'] == {
+        'chat': {'requests': 4, 'total_tokens': 4, 'credit_equivalent': 0.0},
+    }
+
+    # Truncation also falls back to a full rebuild.
+    path.write_text(json.dumps(event('x', 'chat', 1)) + '\n', encoding='utf-8')
+    rollup = codex_chat._load_usage_event_rollup_locked(path)
+    assert rollup['event_count'] == 1
+    assert [item['event_id'] for item in rollup['recent']] == ['x']
+
+
+def test_usage_event_rollup_rebuilds_when_checkpoint_counters_are_invalid(tmp_path):
+    path = tmp_path / 'codex_usage_events.jsonl'
+    rollup_path = tmp_path / 'codex_usage_events.jsonl.rollup.json'
+    for event_id, tokens in (('a', 10), ('b', 20)):
+        codex_chat._append_usage_event(path, {
+            'event_id': event_id,
+            'operation': 'chat',
+            'recorded_at': '2026-05-01T10:00:00+09:00',
+            'total_tokens': tokens,
+        })
+    codex_chat._load_usage_event_rollup_locked(path)
+    checkpoint = json.loads(rollup_path.read_text(encoding='utf-8'))
+
+    for field, corrupt in (
+        ('event_count', '2'),
+        ('by_operation', {'chat': {'requests': None, 'total_tokens': 30, 'credit_equivalent': 0.0}}),
+        ('by_day', {'2026-05-01': {'requests': 2}}),
+        ('offset', -1),
+    ):
+        rollup_path.write_text(json.dumps({**checkpoint, field: corrupt}), encoding='utf-8')
+        codex_chat._USAGE_EVENT_ROLLUP_CACHE.clear()
+
+        rollup = codex_chat._load_usage_event_rollup_locked(path)
+
+        assert rollup['event_count'] == 2, field
+        assert rollup['by_operation']['chat']['total_tokens'] == 30
+        assert rollup['by_day']['2026-05-01']['requests'] == 2
+        assert rollup['offset'] == path.stat().st_size
+
+
 def test_six_hour_account_api_refresh_persists_exact_limits_without_model_request(
         isolated_codex_workspace, monkeypatch):
     calls = []
@@ -927,6 +1882,157 @@ def test_usage_history_v2_separates_account_and_current_workspace_series(
     assert account_summary['scope']['limit_sample_count'] == 3
 
 
+def test_usage_history_summary_reuses_rollups_until_a_sample_is_recorded(
+        isolated_codex_workspace, monkeypatch):
+    now = datetime.now(codex_chat.KST).replace(minute=0, second=0, microsecond=0)
+    snapshots = iter([
+        {
+            'bucket_start': codex_chat.normalize_timestamp(now - timedelta(hours=offset)),
+            'recorded_at': codex_chat.normalize_timestamp(now - timedelta(hours=offset)),
+            'token_account_total': 1000 - offset * 100,
+            'weekly_used_percent': 10 - offset,
+        }
+        for offset in (2, 1, 0)
+    ])
+    monkeypatch.setattr(
+        codex_chat,
+        '_build_usage_history_snapshot',
+        lambda _usage, limit_sample_source=None: next(snapshots),
+    )
+    codex_chat.record_usage_snapshot_if_due(usage_summary={})
+    codex_chat.record_usage_snapshot_if_due(usage_summary={})
+
+    builds = []
+    original_build = codex_chat._build_usage_history_items
+    monkeypatch.setattr(
+        codex_chat,
+        '_build_usage_history_items',
+        lambda items, plan_periods=None: builds.append(len(items)) or original_build(items, plan_periods),
+    )
+
+    first = codex_chat.get_usage_history_summary(hours=24)
+    second = codex_chat.get_usage_history_summary(hours=24)
+    wider = codex_chat.get_usage_history_summary(hours=48)
+    assert builds == [2]
+    assert first['count'] == second['count'] == wider['count'] == 2
+    assert second['token_delta_total'] == 100
+    assert second['window_end'] >= first['window_end']
+
+    codex_chat.record_usage_snapshot_if_due(usage_summary={})
+    refreshed = codex_chat.get_usage_history_summary(hours=24)
+    assert builds == [2, 3]
+    assert refreshed['count'] == 3
+    assert refreshed['token_delta_total'] == 200
+
+
+def test_usage_snapshot_worker_skips_wakes_with_unchanged_inputs(
+        isolated_codex_workspace, monkeypatch):
+    summaries = []
+    # Keep a worker thread started by an earlier route test out of the way.
+    monkeypatch.setattr(codex_chat, '_USAGE_SNAPSHOT_WORKER_CONDITION', threading.Condition())
+    monkeypatch.setattr(codex_chat, '_account_usage_refresh_slot', lambda now=None: None)
+    monkeypatch.setattr(
+        codex_chat,
+        'get_usage_summary',
+        lambda account_id=None: summaries.append(account_id) or {},
+    )
+
+    assert codex_chat._run_usage_snapshot_worker_once() is True
+    assert codex_chat._run_usage_snapshot_worker_once() is False
+    assert len(summaries) == 1
+
+    # A recorded turn changes the ledger; the synchronous snapshot taken by
+    # the recorder already covers it, so the woken worker has nothing to do.
+    codex_chat.record_usage_event(
+        event_id='worker-1', session_id='session-a',
+        usage={'input_tokens': 10, 'output_tokens': 2}, source='unit_test',
+    )
+    assert len(summaries) == 2
+    assert codex_chat._USAGE_SNAPSHOT_WORKER_WAKE_PENDING is True
+    assert codex_chat._run_usage_snapshot_worker_once() is False
+    assert len(summaries) == 2
+
+    # A write the recorder did not see is picked up on the next wake.
+    codex_chat._write_json_atomic(
+        isolated_codex_workspace['token_usage_path'],
+        codex_chat._empty_token_usage_ledger(),
+    )
+    codex_chat._run_usage_snapshot_worker_once()
+    assert len(summaries) == 3
+
+    before_hour = datetime(2026, 7, 21, 9, 59, 30, tzinfo=codex_chat.KST)
+    assert codex_chat._usage_snapshot_next_wake_seconds(before_hour) == pytest.approx(31)
+    quiet_hour = datetime(2026, 7, 21, 9, 1, tzinfo=codex_chat.KST)
+    assert codex_chat._usage_snapshot_next_wake_seconds(quiet_hour) == (
+        codex_chat._USAGE_SNAPSHOT_IDLE_CHECK_SECONDS
+    )
+
+
+def test_usage_snapshot_worker_remembers_inputs_when_no_sample_is_due(
+        isolated_codex_workspace, monkeypatch):
+    summaries = []
+    monkeypatch.setattr(codex_chat, '_USAGE_SNAPSHOT_WORKER_CONDITION', threading.Condition())
+    monkeypatch.setattr(codex_chat, '_account_usage_refresh_slot', lambda now=None: None)
+    monkeypatch.setattr(
+        codex_chat,
+        'get_usage_summary',
+        lambda account_id=None: summaries.append(account_id) or {},
+    )
+
+    # A sample already exists for this hour, so the worker's run is not due.
+    assert codex_chat.record_usage_snapshot_if_due(usage_summary={})['recorded'] is True
+    codex_chat._USAGE_SNAPSHOT_EVALUATED_SIGNATURES.clear()
+    assert codex_chat._run_usage_snapshot_worker_once() is False
+    assert codex_chat._run_usage_snapshot_worker_once() is False
+    assert len(summaries) == 1
+
+    # An empty snapshot is also an evaluation.
+    codex_chat._USAGE_SNAPSHOT_EVALUATED_SIGNATURES.clear()
+    monkeypatch.setattr(codex_chat, '_build_usage_history_snapshot', lambda *args, **kwargs: None)
+    assert codex_chat._run_usage_snapshot_worker_once() is False
+    assert codex_chat._run_usage_snapshot_worker_once() is False
+    assert len(summaries) == 2
+
+
+def test_usage_snapshot_worker_notices_session_log_and_plan_writes(
+        isolated_codex_workspace, monkeypatch):
+    summaries = []
+    monkeypatch.setattr(codex_chat, '_USAGE_SNAPSHOT_WORKER_CONDITION', threading.Condition())
+    monkeypatch.setattr(codex_chat, '_account_usage_refresh_slot', lambda now=None: None)
+    monkeypatch.setattr(codex_chat, '_build_usage_history_snapshot', lambda *args, **kwargs: None)
+    monkeypatch.setattr(
+        codex_chat,
+        'get_usage_summary',
+        lambda account_id=None: summaries.append(account_id) or {},
+    )
+    codex_home = isolated_codex_workspace['workspace_dir'].parent / 'codex-home'
+    storage_context = codex_chat._account_storage_context
+    monkeypatch.setattr(
+        codex_chat,
+        '_account_storage_context',
+        lambda account_id=None: {**storage_context(account_id), 'codex_home': codex_home},
+    )
+    day = codex_home / 'sessions' / '2026' / '07' / '21'
+    day.mkdir(parents=True)
+    session_log = day / 'rollout-a.jsonl'
+    session_log.write_text('{}\n', encoding='utf-8')
+
+    codex_chat._run_usage_snapshot_worker_once()
+    codex_chat._run_usage_snapshot_worker_once()
+    assert len(summaries) == 1
+
+    # Rate limits arrive by appending to a live session log.
+    with session_log.open('a', encoding='utf-8') as handle:
+        handle.write('{"type": "event_msg"}\n')
+    codex_chat._run_usage_snapshot_worker_once()
+    assert len(summaries) == 2
+
+    isolated_codex_workspace['usage_plan_path'].write_text('{"plans": []}', encoding='utf-8')
+    codex_chat._run_usage_snapshot_worker_once()
+    codex_chat._run_usage_snapshot_worker_once()
+    assert len(summaries) == 3
+
+
 def test_usage_history_places_limits_in_the_actual_observation_bucket():
     snapshot = {
         'bucket_start': '2026-07-20T12:00:00+09:00',
@@ -998,6 +2104,61 @@ def test_usage_history_keeps_automatic_limit_sample_when_later_source_is_empty(
     assert limit_sample['weekly_used_percent'] == 42
 
 
+def test_usage_history_upserts_into_cached_keyed_series_without_reparsing(
+        isolated_codex_workspace, monkeypatch):
+    history_path = isolated_codex_workspace['usage_history_path']
+    snapshots = iter([
+        {
+            'bucket_start': f'2026-07-20T{hour:02d}:00:00+09:00',
+            'recorded_at': f'2026-07-20T{hour:02d}:05:00+09:00',
+            'token_account_total': hour * 100,
+            'weekly_used_percent': hour,
+        }
+        for hour in (12, 10, 11)
+    ])
+    monkeypatch.setattr(
+        codex_chat,
+        '_build_usage_history_snapshot',
+        lambda _usage, limit_sample_source=None: next(snapshots),
+    )
+    reads = []
+    original_read = codex_chat._read_usage_history_ledger
+    monkeypatch.setattr(
+        codex_chat,
+        '_read_usage_history_ledger',
+        lambda source_path: reads.append(source_path) or original_read(source_path),
+    )
+
+    for _ in range(3):
+        assert codex_chat.record_usage_snapshot_if_due(usage_summary={})['recorded'] is True
+    ledger = codex_chat._load_usage_history_ledger(path=history_path)
+
+    assert len(reads) == 1
+    assert [item['bucket_start'][11:13] for item in ledger['account_token_samples']] == ['10', '11', '12']
+    assert [item['weekly_used_percent'] for item in ledger['account_limit_samples']] == [10, 11, 12]
+    stored = json.loads(history_path.read_text(encoding='utf-8'))
+    assert [item['token_account_total'] for item in stored['account_token_samples']] == [1000, 1100, 1200]
+
+    # A write from another process is picked up through the file signature.
+    stored['account_token_samples'] = stored['account_token_samples'][:1]
+    history_path.write_text(json.dumps(stored), encoding='utf-8')
+    ledger = codex_chat._load_usage_history_ledger(path=history_path)
+    assert len(reads) == 2
+    assert len(ledger['account_token_samples']) == 1
+
+
+def test_keyed_series_keeps_key_order_and_trims_oldest():
+    series = KeyedSeries(lambda item: item['key'])
+    for key in ('b', 'd', 'a', 'c', 'b'):
+        series.put({'key': key, 'value': key.upper()})
+
+    assert [item['key'] for item in series.samples()] == ['a', 'b', 'c', 'd']
+    assert [item['key'] for item in series.samples(start_key='bb')] == ['c', 'd']
+    assert series.trim(2) == 2
+    assert 'a' not in series and series.get('c') == {'key': 'c', 'value': 'C'}
+    assert len(series) == 2
+
+
 def test_usage_history_preserves_exact_timestamp_for_post_task_limit_sample():
     snapshot = {
         'bucket_start': '2026-07-20T12:00:00+09:00',
@@ -1129,6 +2290,99 @@ def test_usage_summary_reads_newest_limits_from_isolated_runtime_home(tmp_path,
     ]
 
 
+def test_session_rate_limit_index_reads_only_new_bytes_and_rescans_rewrites(tmp_path, monkeypatch):
+    sessions_root = tmp_path / 'home' / 'sessions'
+    log_path = sessions_root / '2026' / '07' / '21' / 'rollout.jsonl'
+    log_path.parent.mkdir(parents=True)
+    context = {'rate_limit_index_path': tmp_path / 'rate-limit-index.json'}
+
+    def limit_line(timestamp, used_percent, limit_id='codex'):
+        return json.dumps({
+            'timestamp': timestamp,
+            'payload': {'rate_limits': {
+                'limit_id': limit_id,
+                'primary': {'used_percent': used_percent, 'window_minutes': 10080},
+            }},
+        }) + '\n'
+
+    log_path.write_text(
+        json.dumps({'type': 'session_meta'}) + '\n' + limit_line('2026-07-21T01:00:00Z', 10),
+        encoding='utf-8',
+    )
+    records = codex_chat._read_indexed_session_rate_limits(context, [sessions_root])
+    assert [record[0]['primary']['used_percent'] for record in records] == [10]
+    stored = json.loads(context['rate_limit_index_path'].read_text(encoding='utf-8'))
+    assert stored['files'][str(log_path)]['offset'] == log_path.stat().st_size
+
+    opened = []
+    original_open = open
+
+    def tracking_open(path, *args, **kwargs):
+        opened.append((str(path), kwargs.get('mode', args[0] if args else 'r')))
+        return original_open(path, *args, **kwargs)
+
+    monkeypatch.setattr('builtins.open', tracking_open)
+    codex_chat._RATE_LIMIT_INDEX_CACHE.clear()
+    records = codex_chat._read_indexed_session_rate_limits(context, [sessions_root])
+    assert [record[0]['primary']['used_percent'] for record in records] == [10]
+    assert (str(log_path), 'rb') not in opened
+
+    # A model-scoped limit does not outrank the account-wide one, whatever
+    # its timestamp; an appended account-wide limit does.
+    with original_open(log_path, 'a', encoding='utf-8') as handle:
+        handle.write(limit_line('2026-07-21T02:00:00Z', 50, limit_id='codex_luna'))
+        handle.write(limit_line('2026-07-21T03:00:00Z', 30))
+        handle.write('{"timestamp": "2026-07-21T04:00:00Z", "payload": {"rate_li')
+    records = codex_chat._read_indexed_session_rate_limits(context, [sessions_root])
+    monkeypatch.undo()
+    assert [record[0]['primary']['used_percent'] for record in records] == [30]
+    entry = codex_chat._RATE_LIMIT_INDEX_CACHE[str(context['rate_limit_index_path'])]['files'][str(log_path)]
+    assert entry['offset'] < log_path.stat().st_size
+
+    # Rewriting the log from scratch drops the old best record.
+    log_path.write_text(limit_line('2026-07-20T00:00:00Z', 7), encoding='utf-8')
+    records = codex_chat._read_indexed_session_rate_limits(context, [sessions_root])
+    assert [record[0]['primary']['used_percent'] for record in records] == [7]
+
+    log_path.unlink()
+    assert codex_chat._read_indexed_session_rate_limits(context, [sessions_root]) == []
+    stored = json.loads(context['rate_limit_index_path'].read_text(encoding='utf-8'))
+    assert stored['files'] == {}
+
+
+def test_list_session_logs_reuses_stats_of_settled_logs(tmp_path, monkeypatch):
+    sessions_root = tmp_path / 'home' / 'sessions'
+    day = sessions_root / '2026' / '07' / '21'
+    day.mkdir(parents=True)
+    old_log = day / 'rollout-old.jsonl'
+    live_log = day / 'rollout-live.jsonl'
+    old_log.write_text('{}\n', encoding='utf-8')
+    live_log.write_text('{}\n', encoding='utf-8')
+    settled_ns = time.time_ns() - codex_chat._SESSION_LOG_SETTLED_NS - 60_000_000_000
+    os.utime(old_log, ns=(settled_ns, settled_ns))
+    for directory in (day, day.parent, day.parent.parent, sessions_root):
+        os.utime(directory, ns=(1, 1))
+    monkeypatch.setattr(codex_chat, '_SESSION_LOG_DIR_CACHE', {})
+    codex_chat._list_session_logs(sessions_root)
+
+    stat_calls = []
+    original_stat = codex_chat.os.stat
+
+    def tracking_stat(path, *args, **kwargs):
+        stat_calls.append(str(path))
+        return original_stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(codex_chat.os, 'stat', tracking_stat)
+    with live_log.open('a', encoding='utf-8') as handle:
+        handle.write('{"more": true}\n')
+    listed = dict(codex_chat._list_session_logs(sessions_root))
+
+    assert str(old_log) not in stat_calls
+    assert str(live_log) in stat_calls
+    assert listed[str(live_log)].st_size == live_log.stat().st_size
+    assert listed[str(old_log)].st_mtime_ns == settled_ns
+
+
 def test_usage_history_splits_limit_relations_at_plan_boundary(isolated_codex_workspace):
     history_path = isolated_codex_workspace['usage_history_path']
     plan_path = isolated_codex_workspace['usage_plan_path']
@@ -3644,6 +4898,107 @@ def test_auto_verification_uses_recent_ui_context_for_short_follow_up(monkeypatc
     assert '## Browser Verification In Workbench' in prompt
 
 
+def test_structured_prompt_trim_plan_matches_dropping_one_block_at_a_time(monkeypatch):
+    monkeypatch.setattr(codex_chat, 'get_settings', lambda: {'verification_mode': 'auto'})
+    memory_lines = [f'{index}. User: earlier note {index} ' + 'x' * index for index in range(1, 12)]
+    recent_blocks = [
+        f'<message index="{index}" role="user">\n' + ('설정 화면의 브라우저 UI ' if index == 5 else 'plain ') * 20 + '\n</message>'
+        for index in range(1, 7)
+    ]
+    prompt_text = '모두 적용해줘'
+    full_length = len(codex_chat._compose_structured_prompt(memory_lines, recent_blocks, prompt_text))
+
+    for max_chars in range(200, full_length + 50, 37):
+        memory, blocks = list(memory_lines), list(recent_blocks)
+        expected = codex_chat._compose_structured_prompt(memory, blocks, prompt_text)
+        while len(expected) > max_chars and memory:
+            memory = memory[1:]
+            expected = codex_chat._compose_structured_prompt(memory, blocks, prompt_text)
+        while len(expected) > max_chars and blocks:
+            blocks = blocks[1:]
+            expected = codex_chat._compose_structured_prompt(memory, blocks, prompt_text)
+
+        memory_drop, block_drop, fits = codex_chat._plan_structured_prompt_trim(
+            memory_lines, recent_blocks, prompt_text, max_chars
+        )
+
+        assert (memory_drop, block_drop) == (len(memory_lines) - len(memory), len(recent_blocks) - len(blocks))
+        assert fits is (len(expected) <= max_chars)
+        assert codex_chat._compose_structured_prompt(
+            memory_lines[memory_drop:], recent_blocks[block_drop:], prompt_text
+        ) == expected
+
+
+def test_build_codex_prompt_renders_trimmed_prompt_once(monkeypatch):
+    monkeypatch.setattr(codex_chat, 'CODEX_CONTEXT_MAX_CHARS', 4000)
+    messages = [
+        {'role': 'user' if index % 2 else 'assistant', 'content': f'message {index} ' + 'y' * 400}
+        for index in range(200)
+    ]
+    renders = []
+    original_compose = codex_chat._compose_structured_prompt
+
+    def _counting_compose(*args, **kwargs):
+        renders.append(args)
+        return original_compose(*args, **kwargs)
+
+    monkeypatch.setattr(codex_chat, '_compose_structured_prompt', _counting_compose)
+
+    prompt = codex_chat.build_codex_prompt(messages, '다음 작업을 진행해줘')
+
+    assert len(renders) == 1
+    assert len(prompt) <= 4000
+    assert '## Current User Request' in prompt
+
+
+def test_build_codex_prompt_reuses_cached_context_for_finalized_messages(isolated_codex_workspace, monkeypatch):
+    monkeypatch.setattr(codex_chat, 'CODEX_CONTEXT_MAX_CHARS', 4000)
+    session = codex_chat.create_session('context cache')
+    for index in range(40):
+        role = 'user' if index % 2 == 0 else 'assistant'
+        codex_chat.append_message(session['id'], role, f'message {index}\n\n  ' + 'z' * 200)
+    messages = codex_chat.get_session(session['id'])['messages']
+    uncached = codex_chat.build_codex_prompt(messages, 'next step')
+
+    assert codex_chat.build_codex_prompt(messages, 'next step', session_id=session['id']) == uncached
+
+    normalized = []
+    original_normalize = codex_chat._normalize_context_text
+
+    def _counting_normalize(value):
+        normalized.append(value)
+        return original_normalize(value)
+
+    monkeypatch.setattr(codex_chat, '_normalize_context_text', _counting_normalize)
+    codex_chat.append_message(session['id'], 'user', 'fresh tail message')
+    messages = codex_chat.get_session(session['id'])['messages']
+    prompt = codex_chat.build_codex_prompt(messages, 'next step', session_id=session['id'])
+
+    assert normalized == ['next step', 'fresh tail message']
+    assert 'fresh tail message' in prompt
+
+    normalized.clear()
+    codex_chat.update_message(session['id'], messages[-2]['id'], content='edited answer')
+    messages = codex_chat.get_session(session['id'])['messages']
+    prompt = codex_chat.build_codex_prompt(messages, 'next step', session_id=session['id'])
+
+    assert normalized == ['next step', 'edited answer']
+    assert 'edited answer' in prompt
+    assert prompt == codex_chat.build_codex_prompt(messages, 'next step')
+
+    # Content replayed from a journal never reaches the in-process
+    # invalidation; a same-length edit in the middle must still show up.
+    original = messages[-3]['content']
+    middle = len(original) // 2
+    replayed = original[:middle] + 'Q' + original[middle + 1:]
+    assert len(replayed) == len(original) and replayed != original
+    messages[-3] = dict(messages[-3], content=replayed)
+    prompt = codex_chat.build_codex_prompt(messages, 'next step', session_id=session['id'])
+
+    assert prompt == codex_chat.build_codex_prompt(messages, 'next step')
+    assert 'Q' in prompt
+
+
 def test_execute_codex_prompt_prepares_imagegen_dirs_and_env(monkeypatch, isolated_codex_workspace):
     workspace_dir = isolated_codex_workspace['workspace_dir']
     stdout_payload = json.dumps({
@@ -7,8 +7,9 @@ import json
 import os
 import sys
 import time
+import zlib
 from pathlib import Path
-from zipfile import ZipFile
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
 
 import pytest
 from cryptography.hazmat.primitives import hashes, serialization
@@ -22,7 +23,7 @@ if str(PROJECT_ROOT) not in sys.path:
 
 from codex_agent import codex_app
 from codex_agent.blueprints import codex_chat as codex_chat_blueprint
-from codex_agent.services import company_credentials, file_browser, terminal_sessions
+from codex_agent.services import archive_cache, company_credentials, file_browser, file_index, terminal_sessions
 
 CODEX_APP_ROOT = Path(codex_app.__file__).resolve().parent
 FILE_CRYPTO_INFO = b'codex-workbench-file-browser-v1'
@@ -48,11 +49,13 @@ def isolated_browser_roots(tmp_path, monkeypatch):
     monkeypatch.setattr(file_browser, '_get_server_root', lambda: server_root)
     monkeypatch.setattr(file_browser, '_get_tmp_root', lambda: tmp_root)
     monkeypatch.setattr(file_browser, 'WORKSPACE_DIR', workspace_root)
+    monkeypatch.setattr(file_browser, '_ARCHIVE_CACHE_DIR', tmp_path / 'archive-cache')
 
     return {
         'server_root': server_root,
         'tmp_root': tmp_root,
         'workspace_root': workspace_root,
+        'archive_cache_dir': (tmp_path / 'archive-cache').resolve(),
     }
 
 
@@ -333,6 +336,184 @@ def test_list_directory_returns_sorted_entries(isolated_browser_roots):
     assert result['entries'][1]['path'] == 'README.md'
 
 
+def test_list_directory_pages_cached_scandir_listing(isolated_browser_roots, monkeypatch):
+    server_root = isolated_browser_roots['server_root']
+    (server_root / 'gen').mkdir(parents=True, exist_ok=True)
+    (server_root / 'gen' / 'sub').mkdir()
+    for index in range(5):
+        (server_root / 'gen' / f'image-{index}.png').write_bytes(b'x' * index)
+    scans = []
+    original_scandir = file_browser.os.scandir
+
+    def _counting_scandir(path):
+        scans.append(Path(path).name)
+        return original_scandir(path)
+
+    monkeypatch.setattr(file_browser.os, 'scandir', _counting_scandir)
+
+    first = file_browser.list_directory(root_key='server', relative_path='gen', limit=4)
+    second = file_browser.list_directory(root_key='server', relative_path='gen', offset=4, limit=4)
+
+    assert scans == ['gen']
+    assert [item['path'] for item in first['entries']] == [
+        'gen/sub', 'gen/image-0.png', 'gen/image-1.png', 'gen/image-2.png',
+    ]
+    assert first['truncated'] is True
+    assert first['next_offset'] == 4
+    assert first['total'] == 6
+    assert [item['name'] for item in second['entries']] == ['image-3.png', 'image-4.png']
+    assert second['entries'][1]['size'] == 4
+    assert second['truncated'] is False
+    assert second['next_offset'] is None
+
+    (server_root / 'gen' / 'image-5.png').write_bytes(b'new')
+    os.utime(server_root / 'gen', ns=(1, 1))
+    refreshed = file_browser.list_directory(root_key='server', relative_path='gen')
+    assert scans == ['gen', 'gen']
+    assert refreshed['total'] == 7
+    assert refreshed['entries'][-1]['path'] == 'gen/image-5.png'
+
+
+def test_search_files_ranks_name_matches_and_skips_vendor_directories(isolated_browser_roots):
+    workspace_root = isolated_browser_roots['workspace_root']
+    (workspace_root / 'src' / 'services').mkdir(parents=True, exist_ok=True)
+    (workspace_root / 'src' / 'services' / 'file_browser.py').write_text('x', encoding='utf-8')
+    (workspace_root / 'src' / 'services' / 'browser_utils.py').write_text('x', encoding='utf-8')
+    (workspace_root / 'docs').mkdir(exist_ok=True)
+    (workspace_root / 'docs' / 'browser').mkdir()
+    (workspace_root / 'docs' / 'browser' / 'notes.md').write_text('x', encoding='utf-8')
+    (workspace_root / 'node_modules' / 'browser').mkdir(parents=True)
+    (workspace_root / 'node_modules' / 'browser' / 'index.js').write_text('x', encoding='utf-8')
+    file_index.get_file_index(workspace_root).refresh()
+
+    result = file_browser.search_files(root_key='workspace', query='browser')
+
+    paths = [item['path'] for item in result['results']]
+    assert paths[0] == 'docs/browser'
+    assert result['results'][0]['type'] == 'dir'
+    assert 'src/services/browser_utils.py' in paths
+    assert 'docs/browser/notes.md' in paths
+    assert not any(path.startswith('node_modules/') for path in paths)
+    vendor = file_browser.search_files(root_key='workspace', query='node_modules')
+    assert [item['path'] for item in vendor['results']] == ['node_modules']
+
+    multi = file_browser.search_files(root_key='workspace', query='services BROWSER', limit=1)
+    assert multi['total'] == 2
+    assert multi['count'] == 1
+    assert multi['truncated'] is True
+    assert multi['results'][0]['path'] == 'src/services/file_browser.py'
+
+    fuzzy = file_browser.search_files(root_key='workspace', query='flbrw')
+    assert [item['path'] for item in fuzzy['results']] == ['src/services/file_browser.py']
+    assert file_browser.search_files(root_key='workspace', query='f' * 40)['total'] == 0
+
+    with pytest.raises(file_browser.FileBrowserError) as exc_info:
+        file_browser.search_files(root_key='workspace', query='   ')
+    assert exc_info.value.error_code == 'invalid_query'
+
+
+def test_search_files_builds_a_new_root_index_in_the_background(isolated_browser_roots):
+    workspace_root = isolated_browser_roots['workspace_root']
+    (workspace_root / 'notes.md').write_text('x', encoding='utf-8')
+
+    first = file_browser.search_files(root_key='workspace', query='notes')
+    assert first['indexing'] is True
+    assert first['results'] == []
+
+    deadline = time.time() + 5
+    result = first
+    while result['indexing'] and time.time() < deadline:
+        time.sleep(0.02)
+        result = file_browser.search_files(root_key='workspace', query='notes')
+    assert result['indexing'] is False
+    assert [item['path'] for item in result['results']] == ['notes.md']
+
+
+def test_index_search_maps_hits_after_paths_that_grow_when_lowered():
+    snapshot = file_index._IndexSnapshot(
+        [(path, False) for path in ('a/İİİİİİİİİİİİ.txt', 'b/x.py', 'c/main.py', 'd/y.md')]
+    )
+
+    assert [snapshot.paths[index] for index in snapshot.search('main', 5)[0]] == ['c/main.py']
+    assert [snapshot.paths[index] for index in snapshot.search('y.md', 5)[0]] == ['d/y.md']
+    assert [snapshot.paths[index] for index in snapshot.search('i̇i̇', 5)[0]] == ['a/İİİİİİİİİİİİ.txt']
+    assert [snapshot.paths[index] for index in snapshot.search('c main', 5)[0]] == ['c/main.py']
+
+
+def test_fuzzy_search_stays_linear_on_pathological_queries(monkeypatch):
+    snapshot = file_index._IndexSnapshot(
+        [(f'src/{"a" * 60}/{"a" * 60}-{index}.txt', False) for index in range(20000)]
+    )
+
+    started = time.perf_counter()
+    assert snapshot.search('a' * 30 + 'b', 10) == ([], 0)
+    assert snapshot.search('a' * 30 + 's', 10) == ([], 0)
+    assert time.perf_counter() - started < 2.0
+
+    monkeypatch.setattr(file_index, 'FUZZY_MAX_SCANNED_PATHS', 100)
+    matches, total = snapshot.search('a/at', 5)
+    assert total == 100
+    assert len(matches) == 5
+
+
+def test_file_index_refresh_rescans_only_changed_directories(tmp_path, monkeypatch):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    (tmp_path / 'a' / 'one.txt').write_text('1', encoding='utf-8')
+    (tmp_path / 'b' / 'two.txt').write_text('2', encoding='utf-8')
+    for directory in (tmp_path, tmp_path / 'a', tmp_path / 'b'):
+        os.utime(directory, ns=(1, 1))
+    index = file_index.FileIndex(tmp_path)
+    scans = []
+    original_scan = index._scan_directory
+
+    def _counting_scan(path):
+        scans.append(Path(path).name)
+        return original_scan(path)
+
+    monkeypatch.setattr(index, '_scan_directory', _counting_scan)
+
+    first = index.refresh()
+    assert sorted(scans) == sorted([tmp_path.name, 'a', 'b'])
+    assert first.search('two', 10) == ([first.paths.index('b/two.txt')], 1)
+
+    scans.clear()
+    assert index.refresh() is first
+    assert scans == []
+
+    (tmp_path / 'b' / 'three.txt').write_text('3', encoding='utf-8')
+    os.utime(tmp_path / 'b', ns=(2, 2))
+    second = index.refresh()
+    assert scans == ['b']
+    assert 'b/three.txt' in second.paths
+    assert len(second) == 5
+
+
+def test_files_search_route_returns_matches(isolated_browser_roots, browser_test_client):
+    server_root = isolated_browser_roots['server_root']
+    (server_root / 'reports').mkdir(parents=True, exist_ok=True)
+    (server_root / 'reports' / 'weekly-report.txt').write_text('x', encoding='utf-8')
+    file_index.get_file_index(server_root).refresh()
+
+    response = browser_test_client.post(
+        '/api/codex/files/search',
+        json={'root': 'server', 'query': 'weekly', 'limit': 5},
+    )
+    empty = browser_test_client.post('/api/codex/files/search', json={'root': 'server'})
+
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload['results'] == [{
+        'name': 'weekly-report.txt',
+        'path': 'reports/weekly-report.txt',
+        'parent_path': 'reports',
+        'type': 'file',
+    }]
+    assert payload['total'] == 1
+    assert empty.status_code == 400
+    assert empty.get_json()['error_code'] == 'invalid_query'
+
+
 def test_read_file_detects_html_and_script(isolated_browser_roots):
     server_root = isolated_browser_roots['server_root']
     (server_root / 'index.html').write_text('<html><body>ok</body></html>', encoding='utf-8')
@@ -652,7 +833,7 @@ def test_build_mail_archive_payload_includes_selected_directories(isolated_brows
     assert result['mime_type'] == 'application/zip'
     assert result['file_count'] == 3
     assert result['directory_count'] >= 1
-    with ZipFile(io.BytesIO(result['content'])) as archive:
+    with ZipFile(result['archive_path']) as archive:
         names = sorted(archive.namelist())
         assert 'README.md' in names
         assert 'docs/' in names
@@ -661,6 +842,103 @@ def test_build_mail_archive_payload_includes_selected_directories(isolated_brows
         assert archive.read('docs/guide.txt').decode('utf-8') == 'guide'
 
 
+def test_archive_cache_reuses_archives_until_a_member_changes(isolated_browser_roots, monkeypatch):
+    server_root = isolated_browser_roots['server_root']
+    (server_root / 'docs').mkdir(parents=True, exist_ok=True)
+    (server_root / 'docs' / 'guide.txt').write_text('guide', encoding='utf-8')
+    (server_root / 'README.md').write_text('# hello', encoding='utf-8')
+    built = []
+    original_iter = file_browser._iter_zip_stream
+
+    def _counting_iter(entries):
+        built.append([name for _, name, _, _ in entries])
+        return original_iter(entries)
+
+    monkeypatch.setattr(file_browser, '_iter_zip_stream', _counting_iter)
+
+    first = file_browser.build_download_stream(root_key='server', relative_paths=['docs', 'README.md'])
+    assert first['cached'] is False
+    streamed = b''.join(first['chunks'])
+
+    mailed = file_browser.build_mail_archive_payload(root_key='server', relative_paths=['README.md', 'docs'])
+    again = file_browser.build_download_stream(root_key='server', relative_paths=['README.md', 'docs'])
+
+    assert len(built) == 1
+    assert again['cached'] is True
+    assert Path(again['file_path']).read_bytes() == streamed
+    assert mailed['archive_path'] == again['file_path']
+    assert Path(mailed['archive_path']).parent == isolated_browser_roots['archive_cache_dir']
+    cache = file_browser._get_archive_cache()
+    archive_key = again['archive_cache_key']
+    assert cache._pins[archive_key] == 2
+    file_browser.release_mail_archive_payload(mailed)
+    file_browser.release_download_stream(again)
+    assert archive_key not in cache._pins
+
+    (server_root / 'docs' / 'guide.txt').write_text('guide v2', encoding='utf-8')
+    changed = file_browser.build_download_stream(root_key='server', relative_paths=['docs', 'README.md'])
+    assert changed['cached'] is False
+    with ZipFile(io.BytesIO(b''.join(changed['chunks']))) as archive:
+        assert archive.read('docs/guide.txt') == b'guide v2'
+    assert len(built) == 2
+
+
+def test_archive_cache_evicts_least_recently_used_archives(tmp_path):
+    cache = archive_cache.ArchiveCache(tmp_path / 'cache', max_bytes=250)
+
+    for key in ('a', 'b', 'c'):
+        cache.store(key, [key.encode('ascii') * 100])
+        if key == 'b':
+            assert cache.lookup('a') is not None
+
+    assert cache.lookup('b') is None
+    assert cache.lookup('a').read_bytes() == b'a' * 100
+    assert cache.lookup('c').read_bytes() == b'c' * 100
+    assert not list((tmp_path / 'cache').glob('.*'))
+
+    reopened = archive_cache.ArchiveCache(tmp_path / 'cache', max_bytes=250)
+    assert reopened.lookup('a') is not None
+
+
+def test_archive_cache_skips_oversized_archives_and_honours_pins(tmp_path):
+    cache = archive_cache.ArchiveCache(tmp_path / 'cache', max_bytes=250)
+
+    assert b''.join(cache.store_stream('big', [b'x' * 200, b'y' * 100])) == b'x' * 200 + b'y' * 100
+    assert cache.lookup('big') is None
+    assert cache.store('hinted', [b'z' * 10], size_hint=1000) is None
+    assert not list((tmp_path / 'cache').iterdir())
+
+    pinned = cache.store('a', [b'a' * 100], pin=True)
+    cache.store('b', [b'b' * 100])
+    cache.store('c', [b'c' * 100])
+    assert pinned.read_bytes() == b'a' * 100
+    assert cache.lookup('b') is None
+
+    cache.release('a')
+    cache.store('b', [b'b' * 100])
+    assert cache.lookup('a') is None
+    assert cache.lookup('c') is not None
+
+    # A budget lowered after a restart evicts archives that no longer fit.
+    shrunk = archive_cache.ArchiveCache(tmp_path / 'cache', max_bytes=50)
+    shrunk.store('d', [b'd' * 40])
+    assert shrunk.lookup('c') is None
+    assert shrunk.lookup('d') is not None
+
+
+def test_archive_cache_is_disabled_inside_a_browser_root(isolated_browser_roots, monkeypatch):
+    server_root = isolated_browser_roots['server_root']
+    (server_root / 'README.md').write_text('# hello', encoding='utf-8')
+    monkeypatch.setattr(file_browser, '_ARCHIVE_CACHE_DIR', isolated_browser_roots['tmp_root'] / 'archives')
+
+    mailed = file_browser.build_mail_archive_payload(root_key='server', relative_paths=['README.md'])
+
+    assert 'archive_path' not in mailed
+    with ZipFile(io.BytesIO(mailed['content'])) as archive:
+        assert archive.read('README.md') == b'# hello'
+    assert not (isolated_browser_roots['tmp_root'] / 'archives').exists()
+
+
 def test_delete_files_rolls_back_when_move_fails(isolated_browser_roots, monkeypatch):
     server_root = isolated_browser_roots['server_root']
     (server_root / 'a.txt').write_text('alpha', encoding='utf-8')
@@ -747,6 +1025,134 @@ def test_download_route_returns_archive_for_selected_directories(browser_test_cl
         assert archive.read('bundle/report.txt').decode('utf-8') == 'report body'
 
 
+def test_download_route_pins_cached_archives_until_the_response_closes(
+        browser_test_client, isolated_browser_roots):
+    server_root = isolated_browser_roots['server_root']
+    (server_root / 'bundle').mkdir(parents=True, exist_ok=True)
+    (server_root / 'bundle' / 'report.txt').write_text('report body', encoding='utf-8')
+    request_json = {'root': 'server', 'paths': ['bundle']}
+
+    first = browser_test_client.post('/api/codex/files/download', json=request_json)
+    streamed = first.data
+    first.close()
+    cache = file_browser._get_archive_cache()
+
+    cached = browser_test_client.post('/api/codex/files/download', json=request_json)
+    assert cache._pins
+    assert cached.data == streamed
+    cached.close()
+    assert not cache._pins
+
+
+def test_build_download_stream_zips_in_chunks_and_stores_compressed_files(isolated_browser_roots, monkeypatch):
+    server_root = isolated_browser_roots['server_root']
+    (server_root / 'bundle').mkdir(parents=True, exist_ok=True)
+    (server_root / 'bundle' / 'notes.txt').write_text('note ' * 2000, encoding='utf-8')
+    (server_root / 'bundle' / 'image.png').write_bytes(bytes(range(256)) * 40)
+    monkeypatch.setattr(file_browser, '_MAX_MULTI_DOWNLOAD_TOTAL_BYTES', 64 * 1024)
+    monkeypatch.setattr(file_browser, '_ARCHIVE_STREAM_CHUNK_BYTES', 1024)
+
+    result = file_browser.build_download_stream(root_key='server', relative_paths=['bundle'])
+
+    assert result['is_archive'] is True
+    assert result['file_count'] == 2
+    chunks = list(result['chunks'])
+    assert len(chunks) > 2
+    with ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+        assert archive.getinfo('bundle/notes.txt').compress_type == ZIP_DEFLATED
+        assert archive.getinfo('bundle/image.png').compress_type == ZIP_STORED
+        assert archive.read('bundle/notes.txt') == b'note ' * 2000
+        assert archive.read('bundle/image.png') == bytes(range(256)) * 40
+
+    monkeypatch.setattr(file_browser, '_MAX_MULTI_DOWNLOAD_TOTAL_BYTES', 1024)
+    with pytest.raises(file_browser.FileBrowserError) as exc_info:
+        file_browser.build_download_stream(root_key='server', relative_paths=['bundle'])
+    assert exc_info.value.error_code == 'file_too_large'
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_zip_stream_round_trips_crc_with_zip64_records(isolated_browser_roots, monkeypatch, workers):
+    server_root = isolated_browser_roots['server_root']
+    (server_root / 'bundle' / '보고서').mkdir(parents=True, exist_ok=True)
+    expected = {
+        'bundle/보고서/요약.txt': '요약 본문\n'.encode('utf-8') * 300,
+        'bundle/photo.png': bytes(range(256)) * 40,
+        'bundle/empty.txt': b'',
+    }
+    for name, payload in expected.items():
+        (server_root / name).write_bytes(payload)
+    # Force every size and offset past the limit to exercise the ZIP64 records.
+    monkeypatch.setattr(file_browser, '_ZIP64_LIMIT', 16)
+    _, _, targets = file_browser._resolve_archive_targets('server', ['bundle'])
+    entries = file_browser._collect_archive_entries(
+        server_root,
+        targets,
+        byte_limit=1024 * 1024,
+        byte_limit_message='too large',
+    )[0]
+
+    content = b''.join(file_browser._iter_zip_stream(entries, workers=workers))
+
+    assert content.count(b'PK\x06\x06') == 1
+    with ZipFile(io.BytesIO(content)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == [name for _, name, _, _ in entries]
+        for name, payload in expected.items():
+            info = archive.getinfo(name)
+            assert info.CRC == zlib.crc32(payload)
+            assert archive.read(name) == payload
+        assert archive.getinfo('bundle/photo.png').compress_type == ZIP_STORED
+        assert archive.getinfo('bundle/보고서/').is_dir()
+
+
+def test_parallel_zip_stream_matches_sequential_contents_in_order(isolated_browser_roots, monkeypatch):
+    server_root = isolated_browser_roots['server_root']
+    (server_root / 'bundle' / 'nested').mkdir(parents=True, exist_ok=True)
+    expected = {}
+    for index in range(12):
+        name = f'bundle/file-{index:02d}.txt' if index % 3 else f'bundle/nested/image-{index:02d}.png'
+        payload = (f'line {index}\n' * (200 + index * 50)).encode('utf-8')
+        (server_root / name).write_bytes(payload)
+        expected[name] = payload
+    (server_root / 'bundle' / 'large.log').write_bytes(b'large\n' * 4000)
+    expected['bundle/large.log'] = b'large\n' * 4000
+    monkeypatch.setattr(file_browser, '_ARCHIVE_PARALLEL_MEMBER_MAX_BYTES', 8 * 1024)
+    monkeypatch.setattr(file_browser, '_ARCHIVE_PARALLEL_PENDING_MAX_BYTES', 16 * 1024)
+    _, _, targets = file_browser._resolve_archive_targets('server', ['bundle'])
+    entries = file_browser._collect_archive_entries(
+        server_root,
+        targets,
+        byte_limit=1024 * 1024,
+        byte_limit_message='too large',
+    )[0]
+
+    sequential = b''.join(file_browser._iter_zip_stream(entries, workers=1))
+    parallel = b''.join(file_browser._iter_zip_stream(entries, workers=4))
+
+    assert parallel == b''.join(file_browser._iter_zip_stream(entries, workers=4))
+    with ZipFile(io.BytesIO(sequential)) as left, ZipFile(io.BytesIO(parallel)) as right:
+        assert right.testzip() is None
+        assert right.namelist() == left.namelist() == [name for _, name, _, _ in entries]
+        for name, payload in expected.items():
+            assert right.read(name) == payload
+            assert right.getinfo(name).compress_type == left.getinfo(name).compress_type
+
+
+def test_download_path_route_serves_byte_ranges(browser_test_client, isolated_browser_roots):
+    server_root = isolated_browser_roots['server_root']
+    (server_root / 'report.txt').write_text('report body', encoding='utf-8')
+
+    response = browser_test_client.get(
+        '/api/codex/files/download/server/report.txt',
+        headers={'Range': 'bytes=7-'},
+    )
+
+    assert response.status_code == 206
+    assert response.data == b'body'
+    assert response.headers['Content-Range'] == 'bytes 7-10/11'
+    assert 'attachment;' in response.headers['Content-Disposition']
+
+
 def test_mail_route_builds_archive_and_calls_sender(browser_test_client, isolated_browser_roots, monkeypatch):
     server_root = isolated_browser_roots['server_root']
     (server_root / 'bundle').mkdir(parents=True, exist_ok=True)
@@ -755,6 +1161,9 @@ def test_mail_route_builds_archive_and_calls_sender(browser_test_client, isolate
 
     def fake_send_mail_with_archive(**kwargs):
         captured.update(kwargs)
+        captured['pinned'] = file_browser._get_archive_cache()._pins.get(
+            kwargs['archive_payload']['archive_cache_key']
+        )
         return {
             'sent': True,
             'from': 'kyjabc@naver.com',
@@ -783,8 +1192,10 @@ def test_mail_route_builds_archive_and_calls_sender(browser_test_client, isolate
     assert response.json['archive']['file_count'] == 1
     assert captured['to'] == 'recipient@example.com'
     assert captured['subject'] == 'Report'
-    with ZipFile(io.BytesIO(captured['archive_payload']['content'])) as archive:
+    with ZipFile(captured['archive_payload']['archive_path']) as archive:
         assert archive.read('bundle/report.txt').decode('utf-8') == 'report body'
+    assert captured['pinned'] == 1
+    assert not file_browser._get_archive_cache()._pins
 
 
 def test_write_route_updates_file(browser_test_client, isolated_browser_roots):